@@ -0,0 +1,117 @@
+# app/budget.py
+"""
+Prompt budgeting (tiktoken) and per-call token accounting.
+
+- count_tokens / count_message_tokens: exact counts with tiktoken (≈ len/4 if tiktoken is missing)
+- trim_to_tokens: cut text on a token boundary instead of a character index
+- fit_context: drop the weakest candidates until the whole prompt (system + query messages +
+  the CONTEXT CANDIDATE message, counted with count_message_tokens) fits PROMPT_TOKEN_BUDGET
+- record_usage: read prompt / completion / cached tokens from a response's `usage`
+  into the per-request list and the process-wide totals (usage_totals())
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import threading
+from functools import lru_cache
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+CHAT_MODEL = os.getenv("OPENAI_MODEL_CHAT", "gpt-4o-mini")
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1400"))  # whole pick / single prompt
+SNIPPET_TOKENS = int(os.getenv("SNIPPET_TOKENS", "70"))              # per candidate snippet
+SUMMARY_TOKENS = int(os.getenv("SUMMARY_TOKENS", "200"))             # summary sent to the reasons call
+
+# -------------------- Tokenizer --------------------------
+
+@lru_cache(maxsize=8)
+def _encoding(model: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None  # e.g. offline and the BPE file is not cached yet -> approximate
+
+def count_tokens(text: str, model: str = CHAT_MODEL) -> int:
+    enc = _encoding(model)
+    if enc is None:
+        return (len(text) + 3) // 4
+    return len(enc.encode(text, disallowed_special=()))
+
+def count_message_tokens(messages: List[Dict[str, Any]], model: str = CHAT_MODEL) -> int:
+    """Chat-format estimate: ~3 tokens framing per message + content, +3 for the reply priming."""
+    total = 3
+    for m in messages:
+        total += 3 + count_tokens(str(m.get("content") or ""), model)
+        if m.get("name"):
+            total += 1
+    return total
+
+def trim_to_tokens(text: str, max_tokens: int, model: str = CHAT_MODEL) -> str:
+    """First `max_tokens` tokens of `text` (with "…" when cut)."""
+    if max_tokens <= 0:
+        return ""
+    enc = _encoding(model)
+    if enc is None:
+        return text if len(text) <= max_tokens * 4 else text[:max_tokens * 4].rstrip() + "…"
+    toks = enc.encode(text, disallowed_special=())
+    if len(toks) <= max_tokens:
+        return text
+    return enc.decode(toks[:max_tokens]).rstrip() + "…"
+
+def context_message(context: List[Dict[str, Any]]) -> Dict[str, str]:
+    return {"role": "assistant", "content": "CONTEXT CANDIDATE: " + json.dumps(context, ensure_ascii=False)}
+
+def fit_context(context: List[Dict[str, Any]], head: List[Dict[str, Any]] | None = None,
+                budget: int = PROMPT_TOKEN_BUDGET, model: str = CHAT_MODEL) -> List[Dict[str, Any]]:
+    """
+    Drop lowest-scored candidates (context is sorted best-first) until `head` (the messages sent
+    before it) + the CONTEXT CANDIDATE message fit `budget` tokens.
+    """
+    head = list(head or [])
+    kept = list(context)
+    while len(kept) > 1 and count_message_tokens(head + [context_message(kept)], model) > budget:
+        kept.pop()
+    return kept
+
+# -------------------- Usage accounting -------------------
+
+_totals: Dict[str, Dict[str, int]] = {}
+_totals_lock = threading.Lock()
+
+def record_usage(usage_log: List[Dict[str, Any]], stage: str, resp: Any) -> None:
+    """Append {stage, prompt, completion, cached} from `resp.usage` (no-op if absent)."""
+    usage = getattr(resp, "usage", None)
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    row = {
+        "stage": stage,
+        "prompt": int(getattr(usage, "prompt_tokens", 0) or 0),
+        "completion": int(getattr(usage, "completion_tokens", 0) or 0),
+        "cached": int(getattr(details, "cached_tokens", 0) or 0) if details is not None else 0,
+    }
+    usage_log.append(row)
+    with _totals_lock:
+        t = _totals.setdefault(stage, {"calls": 0, "prompt": 0, "completion": 0, "cached": 0})
+        t["calls"] += 1
+        for key in ("prompt", "completion", "cached"):
+            t[key] += row[key]
+
+def summarize_usage(usage_log: List[Dict[str, Any]]) -> Dict[str, int]:
+    return {key: sum(r[key] for r in usage_log) for key in ("prompt", "completion", "cached")}
+
+def usage_totals() -> Dict[str, Dict[str, int]]:
+    """Process-wide token totals per stage since start."""
+    with _totals_lock:
+        return {stage: dict(t) for stage, t in _totals.items()}
@@ -0,0 +1,164 @@
+# app/catalog.py
+"""
+Streaming readers for the book catalog (DATA_JSON).
+
+Supported sources:
+  - JSON array  (book_summaries.json)  -> parsed incrementally, one element at a time
+  - JSONL/NDJSON (one object per line)  -> selected by the .jsonl / .ndjson suffix
+  - legacy dict {"Title": "summary"}    -> not streamable; callers fall back to json.loads
+
+Every reader yields (byte_offset, byte_length, item), so callers can seek back to a
+single record later without re-parsing the whole file. Memory stays bounded by the
+largest single record (plus one read chunk), not by the catalog size.
+
+facet_key() names the per-genre / per-theme boolean metadata keys used for filtering.
+"""
+
+from __future__ import annotations
+
+import re
+import json
+import codecs
+import unicodedata
+from pathlib import Path
+from typing import Any, BinaryIO, Iterator, Tuple
+
+CHUNK_SIZE = 1 << 16
+JSONL_SUFFIXES = {".jsonl", ".ndjson"}
+
+_DECODER = json.JSONDecoder()
+_WS = " \t\r\n"
+_SCALAR_END = re.compile(r"[\s,\]]")  # a number / true / false / null is complete once one of these follows
+
+Entry = Tuple[int, int, Any]  # (byte_offset, byte_length, item)
+
+# -------------------- Facets -----------------------------
+
+def facet_key(kind: str, value: str) -> str:
+    """'genre', 'Science Fiction' -> 'genre_science_fiction' (diacritics/punctuation folded)."""
+    v = unicodedata.normalize("NFKD", str(value)).casefold()
+    v = "".join(ch for ch in v if not unicodedata.combining(ch))
+    v = re.sub(r"[^a-z0-9]+", "_", v).strip("_")
+    return f"{kind}_{v}"
+
+# -------------------- Format detection -------------------
+
+def sniff_format(path: str | Path) -> str:
+    """Return 'jsonl', 'array' or 'object' (legacy dict) for the catalog at `path`."""
+    p = Path(path)
+    if p.suffix.lower() in JSONL_SUFFIXES:
+        return "jsonl"
+    with p.open("rb") as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                return "array"  # empty file -> treat as empty array
+            head = chunk.lstrip(b" \t\r\n").removeprefix(codecs.BOM_UTF8).lstrip(b" \t\r\n")
+            if head:
+                return "object" if head[:1] == b"{" else "array"
+
+# -------------------- Readers ----------------------------
+
+def _iter_jsonl(f: BinaryIO) -> Iterator[Entry]:
+    offset = 0
+    for line in f:
+        n = len(line)
+        if line.strip():
+            yield offset, n, json.loads(line)
+        offset += n
+
+def _iter_json_array(f: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[Entry]:
+    dec = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0    # cursor in `buf`
+    bpos = 0   # byte offset in the file matching `pos`
+    eof = False
+
+    def _fill() -> bool:
+        nonlocal buf, pos, eof
+        if eof:
+            return False
+        chunk = f.read(chunk_size)
+        eof = not chunk
+        buf = buf[pos:] + dec.decode(chunk, final=eof)
+        pos = 0
+        return True
+
+    def _advance(new_pos: int) -> None:
+        nonlocal pos, bpos
+        bpos += len(buf[pos:new_pos].encode("utf-8"))
+        pos = new_pos
+
+    def _skip_ws() -> str:
+        """Skip whitespace; return the next char ('' at EOF) without consuming it."""
+        while True:
+            n = pos
+            while n < len(buf) and buf[n] in _WS:
+                n += 1
+            _advance(n)
+            if pos < len(buf):
+                return buf[pos]
+            if not _fill():
+                return ""
+
+    head = f.read(len(codecs.BOM_UTF8))
+    if head == codecs.BOM_UTF8:
+        bpos = len(head)
+    else:
+        buf = dec.decode(head)
+    if _skip_ws() != "[":
+        raise ValueError("DATA_JSON must be a JSON array")
+    _advance(pos + 1)
+
+    first = True
+    while True:
+        ch = _skip_ws()
+        if ch == "]":
+            return
+        if not first:
+            if ch != ",":
+                raise ValueError(f"Malformed JSON array near byte {bpos}")
+            _advance(pos + 1)
+            ch = _skip_ws()
+        first = False
+
+        # A scalar cut by the chunk boundary can still parse ("4." -> 4): wait for its delimiter
+        if ch not in '"{[':
+            while not eof and not _SCALAR_END.search(buf, pos):
+                _fill()
+
+        # Decode one element; pull more data while it is incomplete (or may be, at buffer end)
+        while True:
+            try:
+                item, end = _DECODER.raw_decode(buf, pos)
+                if end < len(buf) or eof:
+                    break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+            _fill()
+        start = bpos
+        _advance(end)
+        yield start, bpos - start, item
+
+def iter_entries(path: str | Path) -> Iterator[Entry]:
+    """Yield (byte_offset, byte_length, item) for each catalog element, streaming."""
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"DATA_JSON file not found: {p}")
+    fmt = sniff_format(p)
+    if fmt == "object":
+        raise ValueError("Legacy dict catalogs cannot be streamed; load them with json.loads")
+    with p.open("rb") as f:
+        yield from (_iter_jsonl(f) if fmt == "jsonl" else _iter_json_array(f))
+
+def iter_items(path: str | Path) -> Iterator[Any]:
+    """Yield catalog elements one by one (offsets dropped)."""
+    for _, _, item in iter_entries(path):
+        yield item
+
+def read_entry(path: str | Path, offset: int, length: int) -> Any:
+    """Decode the single element stored at [offset, offset+length) — one small read."""
+    with Path(path).open("rb") as f:
+        f.seek(offset)
+        return json.loads(f.read(length).decode("utf-8"))
@@ -1,31 +1,50 @@
 import os
 import json
-import csv
-import datetime
-from typing import Dict, List
+import time
+import asyncio
+from typing import Dict, Iterator, List, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import OpenAI, AsyncOpenAI
 
 # ---- Robust imports: works in package *and* script mode ----
 try:
-    from .rag import search_books
-    from .tools import get_summary_by_title
+    from .rag import search_books, embed
+    from .index_version import current_index_version
+    from .tools import get_summary_by_title, match_catalog
     from .speech import tts_say  # <- TTS helper (pyttsx3)
+    from .budget import (SNIPPET_TOKENS, SUMMARY_TOKENS, context_message, fit_context,
+                         record_usage, summarize_usage, trim_to_tokens)
+    from . import llm_cache, semantic_cache
+    from .prefs_store import DEFAULT_USER, get_store as get_prefs_store
+    from .interaction_log import log_event
+    from . import metrics
 except Exception:
     import sys
     CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
     if CURRENT_DIR not in sys.path:
         sys.path.insert(0, CURRENT_DIR)
-    from rag import search_books
-    from tools import get_summary_by_title
+    from rag import search_books, embed
+    from index_version import current_index_version
+    from tools import get_summary_by_title, match_catalog
     from speech import tts_say
+    from budget import (SNIPPET_TOKENS, SUMMARY_TOKENS, context_message, fit_context,
+                        record_usage, summarize_usage, trim_to_tokens)
+    import llm_cache, semantic_cache
+    from prefs_store import DEFAULT_USER, get_store as get_prefs_store
+    from interaction_log import log_event
+    import metrics
 # ------------------------------------------------------------
 
 load_dotenv(override=True)
 
 CHAT_MODEL = os.getenv("OPENAI_MODEL_CHAT", "gpt-4o-mini")
 TEMP_DEFAULT = float(os.getenv("CHAT_TEMPERATURE", "0.2"))
+# Exact/near-exact title or author queries are answered from the catalog, without model calls
+FAST_PATH = os.getenv("FAST_PATH", "true").lower() in {"1", "true", "yes", "y"}
+# "two_step": forced tool call + separate reasons call (default)
+# "single":   one structured-output call returns title + reasons; the summary tool runs locally
+RECO_MODE = os.getenv("RECO_MODE", "two_step").strip().lower()
 
 ASSETS_DIR = Path(os.getenv("ASSETS_DIR", "./assets/covers")).resolve()
 ASSETS_DIR.mkdir(parents=True, exist_ok=True)
@@ -33,11 +52,11 @@ ASSETS_DIR.mkdir(parents=True, exist_ok=True)
 DATA_DIR = Path("data")
 DATA_DIR.mkdir(exist_ok=True)
 PREFS_PATH = DATA_DIR / "user_prefs.json"
-LOG_PATH = DATA_DIR / "log.csv"
 
 client = OpenAI()
 
 BANNED = {"idiot", "stupid", "retard", "disgusting", "fuck", "shit"}  # demo simplu
+INAPPROPRIATE_TEXT = "Prefer să păstrez conversația respectuoasă. Te rog reformulează fără cuvinte ofensatoare."
 
 TOOLS = [{
     "type": "function",
@@ -62,62 +81,56 @@ SYSTEM = (
 )
 
 # ---------------------- Preferences ----------------------
-def _init_prefs_file():
-    if not PREFS_PATH.exists():
-        PREFS_PATH.write_text(json.dumps({"liked": [], "disliked": []}, ensure_ascii=False, indent=2), encoding="utf-8")
+# Per-user likes/dislikes live in prefs_store (SQLite + in-process cache); PREFS_PATH is the
+# legacy global JSON file, imported once under DEFAULT_USER.
 
-def load_prefs() -> Dict[str, List[str]]:
-    _init_prefs_file()
-    try:
-        return json.loads(PREFS_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        return {"liked": [], "disliked": []}
-
-def save_prefs(p: Dict[str, List[str]]):
-    PREFS_PATH.write_text(json.dumps(p, ensure_ascii=False, indent=2), encoding="utf-8")
-
-def record_feedback(title: str, liked: bool):
-    p = load_prefs()
-    tl = title.strip()
-    if liked:
-        if tl not in p["liked"]:
-            p["liked"].append(tl)
-        if tl in p["disliked"]:
-            p["disliked"].remove(tl)
-    else:
-        if tl not in p["disliked"]:
-            p["disliked"].append(tl)
-        if tl in p["liked"]:
-            p["liked"].remove(tl)
-    save_prefs(p)
+def load_prefs(user_id: str | None = None) -> Dict[str, List[str]]:
+    return get_prefs_store().export(user_id or DEFAULT_USER)
+
+def save_prefs(p: Dict[str, List[str]], user_id: str | None = None):
+    get_prefs_store().replace(user_id or DEFAULT_USER, p.get("liked", []), p.get("disliked", []))
+
+def record_feedback(title: str, liked: bool, user_id: str | None = None):
+    get_prefs_store().set_feedback(user_id or DEFAULT_USER, title, liked)
 
 # ---------------------- Logging -------------------------
-def log_interaction(query: str, picked_title: str | None, picked_score: float | None):
-    exists = LOG_PATH.exists()
-    with LOG_PATH.open("a", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        if not exists:
-            w.writerow(["ts_utc", "query", "picked_title", "picked_score"])
-        w.writerow([
-            datetime.datetime.utcnow().isoformat(),
-            query,
-            picked_title or "",
-            f"{picked_score:.4f}" if isinstance(picked_score, (int, float)) else ""
-        ])
+# Records go to interaction_log's background writer (JSONL); nothing here touches the disk.
+
+def _timed(timings: Dict[str, float], stage: str):
+    """Time the block into the chatbot.<stage> histogram and timings[stage] (ms)."""
+    return metrics.span(f"chatbot.{stage}", timings, stage)
+
+def log_interaction(query: str, picked_title: str | None, picked_score: float | None,
+                    user_id: str | None = None, route: str = "rag", timings: Dict[str, float] | None = None,
+                    started: float | None = None, usage: List[Dict] | None = None):
+    latency = dict(timings or {})
+    if started is not None:
+        total = time.perf_counter() - started
+        metrics.observe(f"chatbot.recommend.{route}", total)
+        latency["total"] = round(total * 1000, 2)
+    log_event({
+        "user_id": user_id or DEFAULT_USER,
+        "route": route,  # fast | semantic | rag
+        "query": query,
+        "picked_title": picked_title,
+        "picked_score": round(picked_score, 4) if isinstance(picked_score, (int, float)) else None,
+        "latency_ms": latency,
+        "tokens": summarize_usage(usage or []),
+    })
 
 # -------------------- Helpers ----------------------
 def is_inappropriate(text: str) -> bool:
     t = text.lower()
     return any(bad in t for bad in BANNED)
 
-def _apply_personalization(context: List[Dict]) -> None:
-    prefs = load_prefs()
-    liked = set([t.lower() for t in prefs.get("liked", [])])
-    disliked = set([t.lower() for t in prefs.get("disliked", [])])
+def _apply_personalization(context: List[Dict], user_id: str | None = None) -> None:
+    prefs = get_prefs_store().get(user_id or DEFAULT_USER)
+    if not prefs.liked and not prefs.disliked:
+        return
     for c in context:
-        t = c["title"].lower()
-        if t in liked:    c["score"] += 0.05
-        if t in disliked: c["score"] -= 0.05
+        t = c["title"].casefold()
+        if t in prefs.liked:    c["score"] += 0.05
+        if t in prefs.disliked: c["score"] -= 0.05
     context.sort(key=lambda x: x["score"], reverse=True)
 
 def _looks_like_generation_request(q: str) -> bool:
@@ -129,51 +142,114 @@ def _looks_like_generation_request(q: str) -> bool:
     ]
     return any(t in ql for t in triggers)
 
-# -------------------- Public API ------------------------
-def recommend_with_tool(
-    user_query: str,
-    k: int | None = None,
-    temperature: float | None = None,
-    tts: bool = False,
-    gen_image: bool = False
-) -> Dict:
-    if is_inappropriate(user_query):
-        return {"text": "Prefer să păstrez conversația respectuoasă. Te rog reformulează fără cuvinte ofensatoare.",
-                "audio": None, "image": None, "picked_title": None, "picked_score": None}
+def _fast_path_answer(user_query: str) -> Dict | None:
+    """
+    Deterministic router: if the query *is* a catalog title/author, answer from stored
+    metadata (no embedding, no vector query, no LLM). None -> use the full pipeline.
+    """
+    try:
+        hit = match_catalog(user_query)
+    except Exception:
+        return None
+    if not hit:
+        return None
+    rec = hit["record"]
+    title = str(rec.get("title") or "").strip()
+    if not title:
+        return None
+    author = str(rec.get("author") or "").strip()
+    year = rec.get("year")
+    genres = ", ".join(str(g) for g in (rec.get("genres") or []))
+    themes = ", ".join(str(t) for t in (rec.get("themes") or []))
+
+    if hit["match"] == "author":
+        reasons = [f"- Ai căutat autorul **{author}**; acesta este un titlu al său din catalog."]
+        if hit["others"]:
+            reasons.append(f"- Alte titluri de {author} în catalog: " + ", ".join(hit["others"]) + ".")
+    else:
+        by = f" ({author}, {year})" if author and year else (f" ({author})" if author else "")
+        reasons = [f"- Ai cerut exact acest titlu{by}, iar el există în catalog."]
+    if genres:
+        reasons.append(f"- Gen: {genres}.")
+    if themes:
+        reasons.append(f"- Teme: {themes}.")
+
+    summary = str(rec.get("summary") or "").strip()
+    text = f"**Recomandare:** {title}\n\n**De ce:**\n" + "\n".join(reasons) + f"\n\n**Rezumat detaliat:**\n{summary}"
+    return {"text": text, "picked_title": title, "picked_score": hit["score"]}
+
+def _semantic_scope(k: int | None, filters: Dict | None, mode: str | None, user_id: str | None = None) -> str:
+    """Answers are only reused between requests with the same k / filters / mode (and prefs, if any)."""
+    prefs = get_prefs_store().get(user_id or DEFAULT_USER)
+    personal = [user_id or DEFAULT_USER, prefs.stamp] if prefs.stamp else None
+    return json.dumps({"k": k, "filters": filters or {}, "mode": mode or RECO_MODE, "prefs": personal},
+                      sort_keys=True, default=str)
+
+def _semantic_lookup(user_query: str, scope: str) -> Tuple[Dict | None, List[float] | None]:
+    """-> (cached answer or None, query embedding for _semantic_store); (None, None) when disabled."""
+    if not semantic_cache.SEMANTIC_CACHE_ENABLED:
+        return None, None
+    try:
+        vec = embed(user_query)  # served from the embedding cache again by search_books on a miss
+    except Exception:
+        return None, None
+    hit = semantic_cache.get_cache().get(vec, scope, current_index_version())
+    return (hit[1] if hit else None), vec
+
+def _semantic_store(vec: List[float] | None, scope: str, text: str,
+                    picked_title: str | None, picked_score: float | None) -> None:
+    if vec is not None and picked_title:
+        semantic_cache.get_cache().put(vec, scope, current_index_version(),
+                                       {"text": text, "picked_title": picked_title, "picked_score": picked_score})
+
+# -------------------- Pipeline stages ------------------------
+# Shared by recommend_with_tool (sync) and arecommend_with_tool (async).
+
+INTENT_GUARD = (
+    "User intent: RECOMMENDATION ONLY. "
+    "If the user asked to 'write a story', re-interpret as 'recommend an existing book'. "
+    "Never write story text."
+)
 
-    # 1) RAG
-    candidates = search_books(user_query, k=k)
+REASONS_SYSTEM = (
+    "Generează exclusiv o listă de 2-3 bullet-uri scurte cu MOTIVE pentru care titlul ales se potrivește "
+    "cererii utilizatorului. Nu scrie poveste/ficțiune. Nu inventa detalii. "
+    "Fără titlu înapoi, doar bullet-urile."
+)
+
+NO_PICK_TEXT = "Nu am reușit să aleg un titlu din context. Încearcă să reformulezi întrebarea."
+
+def _build_context(candidates: List[Dict], user_id: str | None, user_query: str, single: bool) -> List[Dict]:
     context = [
         {
             "title": c["title"],
-            "snippet": (c["document"][:280] + ("…" if len(c["document"]) > 280 else "")),
+            "snippet": trim_to_tokens(c["document"], SNIPPET_TOKENS),
             "score": round(float(c["score"]), 4)
         }
         for c in candidates
     ]
-    _apply_personalization(context)
-    top_ctx = context[:3]
+    _apply_personalization(context, user_id)
+    # PROMPT_TOKEN_BUDGET covers the whole first prompt, query included
+    return fit_context(context, _prompt_head(_prepare_query(user_query), single))
 
-    # 2) Mesaje: întărim intenția de RECOMANDARE
-    intent_guard = (
-        "User intent: RECOMMENDATION ONLY. "
-        "If the user asked to 'write a story', re-interpret as 'recommend an existing book'. "
-        "Never write story text."
-    )
+def _prepare_query(user_query: str) -> str:
     if _looks_like_generation_request(user_query):
-        user_query = f"{user_query}\n(Notă: tratează ca cerere de RECOMANDARE, nu de generare de text.)"
-
-    messages = [
-        {"role": "system", "content": SYSTEM},
+        return f"{user_query}\n(Notă: tratează ca cerere de RECOMANDARE, nu de generare de text.)"
+    return user_query
+
+def _prompt_head(user_query: str, single: bool) -> List[Dict]:
+    """Messages before CONTEXT CANDIDATE in the pick / single prompts."""
+    return [
+        # static prefix first (system + guard) so provider-side prompt caching can hit
+        {"role": "system", "content": SINGLE_SYSTEM if single else SYSTEM},
+        {"role": "system", "content": INTENT_GUARD},
         {"role": "user", "content": user_query},
-        {"role": "assistant", "content": intent_guard},
-        {"role": "assistant", "content": "CONTEXT CANDIDATE: " + json.dumps(context, ensure_ascii=False)}
     ]
 
-    temp = float(temperature if temperature is not None else TEMP_DEFAULT)
-
-    # 3) PRIMUL PAS: forțează DOAR apel de tool cu titlul ales
-    first = client.chat.completions.create(
+def _pick_kwargs(user_query: str, context: List[Dict], temp: float) -> Dict:
+    """PRIMUL PAS: forțează DOAR apel de tool cu titlul ales."""
+    messages = _prompt_head(user_query, False) + [context_message(context)]
+    return dict(
         model=CHAT_MODEL,
         messages=messages,
         tools=TOOLS,
@@ -181,83 +257,160 @@ def recommend_with_tool(
         temperature=temp,
         max_tokens=200
     )
-    msg = first.choices[0].message
 
+def _score_for(picked_title: str | None, context: List[Dict]) -> float | None:
+    if picked_title:
+        for c in context:
+            if c["title"].lower() == picked_title.lower():
+                return c["score"]
+    return None
+
+def _local_summary(picked_title: str | None) -> str:
+    try:
+        return get_summary_by_title(picked_title)
+    except Exception as e:
+        return f"Eroare tool: {e}"
+
+def _run_tool_calls(msg, context: List[Dict]) -> Tuple[str | None, float | None, str]:
+    """Execute the (forced) get_summary_by_title call locally -> (picked_title, picked_score, summary)."""
     picked_title = None
     picked_score = None
-    text = ""
-
-    # 4) Executăm tool-ul (obligatoriu)
     summary = ""
-    if msg.tool_calls:
-        messages.append({
-            "role": "assistant",
-            "content": msg.content or "",
-            "tool_calls": [
-                {"id": tc.id, "type":"function",
-                 "function":{"name": tc.function.name, "arguments": tc.function.arguments}}
-                for tc in msg.tool_calls
-            ]
-        })
-        for tc in msg.tool_calls:
-            if tc.function.name == "get_summary_by_title":
-                args = json.loads(tc.function.arguments)
-                picked_title = args.get("title")
-                if picked_title:
-                    for c in context:
-                        if c["title"].lower() == picked_title.lower():
-                            picked_score = c["score"]
-                            break
-                try:
-                    summary = get_summary_by_title(picked_title)
-                except Exception as e:
-                    summary = f"Eroare tool: {e}"
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": tc.id,
-                    "name": "get_summary_by_title",
-                    "content": summary
-                })
-
-        # 5) AL DOILEA PAS: cerem DOAR 2–3 motive (bullets), fără ficțiune
-        reasons_system = (
-            "Generează exclusiv o listă de 2-3 bullet-uri scurte cu MOTIVE pentru care titlul ales se potrivește "
-            "cererii utilizatorului. Nu scrie poveste/ficțiune. Nu inventa detalii. "
-            "Fără titlu înapoi, doar bullet-urile."
-        )
-        messages2 = [
-            {"role": "system", "content": reasons_system},
-            {"role": "user", "content": f"Cerere utilizator: {user_query}"},
-            {"role": "assistant", "content": "CONTEXT CANDIDATE: " + json.dumps(context, ensure_ascii=False)},
-            {"role": "assistant", "content": f"Titlul ales: {picked_title}"},
-            {"role": "assistant", "content": f"Rezumat (din tool) pentru context, nu de rescris: {summary[:800]}"}
-        ]
-        reasons = client.chat.completions.create(
-            model=CHAT_MODEL,
-            messages=messages2,
-            temperature=0.1,
-            max_tokens=200
-        ).choices[0].message.content or ""
-
-        # 6) Compunem răspunsul final
-        text = f"**Recomandare:** {picked_title}\n\n**De ce:**\n{reasons}\n\n**Rezumat detaliat:**\n{summary}"
+    for tc in msg.tool_calls or []:
+        if tc.function.name == "get_summary_by_title":
+            args = json.loads(tc.function.arguments)
+            picked_title = args.get("title")
+            picked_score = _score_for(picked_title, context)
+            summary = _local_summary(picked_title)
+    return picked_title, picked_score, summary
+
+def _reasons_kwargs(user_query: str, context: List[Dict], picked_title: str | None, summary: str) -> Dict:
+    """AL DOILEA PAS: cerem DOAR 2–3 motive (bullets), fără ficțiune."""
+    messages2 = [
+        {"role": "system", "content": REASONS_SYSTEM},
+        {"role": "user", "content": f"Cerere utilizator: {user_query}"},
+        context_message(context),
+        {"role": "assistant", "content": f"Titlul ales: {picked_title}"},
+        {"role": "assistant", "content": f"Rezumat (din tool) pentru context, nu de rescris: {trim_to_tokens(summary, SUMMARY_TOKENS)}"}
+    ]
+    return dict(model=CHAT_MODEL, messages=messages2, temperature=0.1, max_tokens=200)
 
-    else:
-        text = "Nu am reușit să aleg un titlu din context. Încearcă să reformulezi întrebarea."
+SINGLE_SYSTEM = (
+    "Ești Smart Librarian.\n"
+    "Scop: RECOMANDĂ o singură carte DEJA EXISTENTĂ, din CONTEXTUL primit (lista de titluri). "
+    "NU inventa titluri, NU scrie proză/ficțiune. "
+    "Răspunde DOAR cu JSON: title = titlul ales exact ca în context; "
+    "reasons = 2-3 motive scurte pentru care se potrivește cererii (fără detalii inventate)."
+)
 
-    # Citări
-    if top_ctx:
-        cite_lines = "\n".join([f"- **{c['title']}** (sim={c['score']:.3f}) – {c['snippet']}" for c in top_ctx])
-        text = f"{text}\n\n**Context folosit (RAG):**\n{cite_lines}"
+SINGLE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "recommendation",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "title": {"type": "string"},
+                "reasons": {"type": "array", "items": {"type": "string"}}
+            },
+            "required": ["title", "reasons"],
+            "additionalProperties": False
+        }
+    }
+}
 
-    # Log
-    log_interaction(user_query, picked_title, picked_score)
+def _single_kwargs(user_query: str, context: List[Dict], temp: float) -> Dict:
+    """Single round trip: title + reasons in one structured-output call."""
+    messages = _prompt_head(user_query, True) + [context_message(context)]
+    return dict(
+        model=CHAT_MODEL,
+        messages=messages,
+        response_format=SINGLE_FORMAT,
+        temperature=temp,
+        max_tokens=300
+    )
+
+def _parse_single(msg) -> Tuple[str | None, str]:
+    """-> (picked_title, reasons as markdown bullets); (None, "") if the JSON is unusable."""
+    try:
+        data = json.loads(msg.content or "")
+    except (TypeError, ValueError):
+        return None, ""
+    title = str(data.get("title") or "").strip() or None
+    reasons = "\n".join(f"- {str(r).strip().lstrip('-• ').strip()}" for r in data.get("reasons") or [] if str(r).strip())
+    return title, reasons
+
+def _use_single(mode: str | None) -> bool:
+    return (mode or RECO_MODE) == "single"
+
+def _head_text(picked_title: str | None) -> str:
+    return f"**Recomandare:** {picked_title}\n\n**De ce:**\n"
 
+def _summary_text(summary: str) -> str:
+    return f"\n\n**Rezumat detaliat:**\n{summary}"
+
+def _compose_text(picked_title: str | None, reasons: str, summary: str) -> str:
+    return _head_text(picked_title) + reasons + _summary_text(summary)
+
+def _citations_text(context: List[Dict]) -> str:
+    top_ctx = context[:3]
+    if not top_ctx:
+        return ""
+    cite_lines = "\n".join([f"- **{c['title']}** (sim={c['score']:.3f}) – {c['snippet']}" for c in top_ctx])
+    return f"\n\n**Context folosit (RAG):**\n{cite_lines}"
+
+def _with_citations(text: str, context: List[Dict]) -> str:
+    return text + _citations_text(context)
+
+def _cover_prompt(picked_title: str | None) -> str:
+    return f"Minimalist symbolic book cover that fits the themes of '{picked_title}'."
+
+def _save_cover(b64_json: str) -> Path:
+    import base64, io
+    from PIL import Image
+    raw = base64.b64decode(b64_json)
+    image_path = ASSETS_DIR / "cover.png"
+    Image.open(io.BytesIO(raw)).save(str(image_path))
+    return image_path
+
+def _result(text: str, audio_path, image_path, picked_title: str | None, picked_score: float | None,
+            usage: List[Dict] | None = None) -> Dict:
+    usage = usage or []
+    return {
+        "text": text,
+        "audio": str(audio_path) if audio_path else None,
+        "image": str(image_path) if image_path else None,
+        "picked_title": picked_title,
+        "picked_score": picked_score,
+        "usage": {"calls": usage, **summarize_usage(usage)}
+    }
+
+def _cache_hit(stage: str, usage: List[Dict]) -> None:
+    usage.append({"stage": stage, "prompt": 0, "completion": 0, "cached": 0, "llm_cache": True})
+
+def _chat(stage: str, usage: List[Dict], **kwargs):
+    """client.chat.completions.create + token accounting for `stage` (served from llm_cache if enabled)."""
+    resp = llm_cache.lookup(kwargs)
+    if resp is not None:
+        _cache_hit(stage, usage)
+        return resp
+    resp = client.chat.completions.create(**kwargs)
+    record_usage(usage, stage, resp)
+    llm_cache.store(kwargs, resp)
+    return resp
+
+def _finalize(text: str, picked_title: str | None, picked_score: float | None,
+              tts: bool, gen_image: bool, usage: List[Dict] | None = None,
+              timings: Dict[str, float] | None = None) -> Dict:
+    """Optional TTS + cover image, then the public result dict."""
+    timings = timings if timings is not None else {}
     # -------- TTS (toggle) --------
     audio_path = None
     if tts and text:
         try:
-            audio_path = tts_say(text, ASSETS_DIR)
+            with _timed(timings, "tts"):
+                audio_path = tts_say(text, ASSETS_DIR)
         except Exception:
             audio_path = None
 
@@ -265,20 +418,347 @@ def recommend_with_tool(
     image_path = None
     if gen_image:
         try:
-            prompt = f"Minimalist symbolic book cover that fits the themes of '{picked_title}'."
-            img = client.images.generate(model="gpt-image-1", prompt=prompt, size="1024x1024", n=1)
-            import base64, io
-            from PIL import Image
-            raw = base64.b64decode(img.data[0].b64_json)
-            image_path = ASSETS_DIR / "cover.png"
-            Image.open(io.BytesIO(raw)).save(str(image_path))
+            with _timed(timings, "image"):
+                img = client.images.generate(model="gpt-image-1", prompt=_cover_prompt(picked_title),
+                                             size="1024x1024", n=1)
+                image_path = _save_cover(img.data[0].b64_json)
         except Exception:
             image_path = None
 
-    return {
-        "text": text,
-        "audio": str(audio_path) if audio_path else None,
-        "image": str(image_path) if image_path else None,
-        "picked_title": picked_title,
-        "picked_score": picked_score
-    }
+    return _result(text, audio_path, image_path, picked_title, picked_score, usage)
+
+# -------------------- Public API ------------------------
+def recommend_with_tool(
+    user_query: str,
+    k: int | None = None,
+    temperature: float | None = None,
+    tts: bool = False,
+    gen_image: bool = False,
+    fast_path: bool | None = None,
+    filters: Dict | None = None,
+    mode: str | None = None,
+    user_id: str | None = None
+) -> Dict:
+    if is_inappropriate(user_query):
+        return _result(INAPPROPRIATE_TEXT, None, None, None, None)
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    # 0) Fast path: exact title/author -> answer straight from the catalog
+    if (FAST_PATH if fast_path is None else fast_path) and not filters:
+        with _timed(timings, "fast_path"):
+            fast = _fast_path_answer(user_query)
+        if fast:
+            out = _finalize(fast["text"], fast["picked_title"], fast["picked_score"], tts, gen_image, timings=timings)
+            log_interaction(user_query, fast["picked_title"], fast["picked_score"], user_id, "fast", timings, started)
+            return out
+
+    # 0b) Semantic cache: near-duplicate of an earlier query -> reuse that answer (no RAG, no LLM)
+    scope = _semantic_scope(k, filters, mode, user_id)
+    with _timed(timings, "semantic_cache"):
+        cached, qvec = _semantic_lookup(user_query, scope)
+    if cached:
+        out = _finalize(cached["text"], cached["picked_title"], cached["picked_score"], tts, gen_image, timings=timings)
+        log_interaction(user_query, cached["picked_title"], cached["picked_score"], user_id, "semantic", timings, started)
+        return out
+
+    # 1) RAG
+    with _timed(timings, "rag"):
+        context = _build_context(search_books(user_query, k=k, filters=filters), user_id, user_query,
+                                 _use_single(mode))
+
+    # 2) Mesaje: întărim intenția de RECOMANDARE
+    user_query = _prepare_query(user_query)
+    temp = float(temperature if temperature is not None else TEMP_DEFAULT)
+    usage: List[Dict] = []
+
+    if _use_single(mode):
+        # 3') Un singur apel: titlu + motive (structured output); rezumatul vine local
+        with _timed(timings, "single"):
+            msg = _chat("single", usage, **_single_kwargs(user_query, context, temp)).choices[0].message
+        picked_title, reasons = _parse_single(msg)
+        picked_score = _score_for(picked_title, context)
+        with _timed(timings, "summary"):
+            summary = _local_summary(picked_title) if picked_title else ""
+        text = _compose_text(picked_title, reasons, summary) if picked_title else NO_PICK_TEXT
+    else:
+        # 3) Alegem titlul (tool call forțat)
+        with _timed(timings, "pick"):
+            msg = _chat("pick", usage, **_pick_kwargs(user_query, context, temp)).choices[0].message
+
+        # 4) Executăm tool-ul (obligatoriu) + 5) motivele
+        with _timed(timings, "summary"):
+            picked_title, picked_score, summary = _run_tool_calls(msg, context)
+        if msg.tool_calls:
+            with _timed(timings, "reasons"):
+                reasons = _chat(
+                    "reasons", usage, **_reasons_kwargs(user_query, context, picked_title, summary)
+                ).choices[0].message.content or ""
+            # 6) Compunem răspunsul final
+            text = _compose_text(picked_title, reasons, summary)
+        else:
+            text = NO_PICK_TEXT
+
+    # Citări
+    text = _with_citations(text, context)
+    _semantic_store(qvec, scope, text, picked_title, picked_score)
+
+    out = _finalize(text, picked_title, picked_score, tts, gen_image, usage, timings)
+
+    # Log
+    log_interaction(user_query, picked_title, picked_score, user_id, "rag", timings, started, usage)
+    return out
+
+# -------------------- Streaming API ------------------------
+def recommend_stream(
+    user_query: str,
+    k: int | None = None,
+    temperature: float | None = None,
+    tts: bool = False,
+    gen_image: bool = False,
+    fast_path: bool | None = None,
+    filters: Dict | None = None,
+    mode: str | None = None,
+    result: Dict | None = None,
+    user_id: str | None = None
+) -> Iterator[str]:
+    """
+    Generator version of recommend_with_tool for `st.write_stream`: yields the header as soon as
+    the title is picked, then the reasons token by token, then the summary and RAG citations.
+    Concatenated chunks equal the final text. If `result` is given, it is filled in place with the
+    same dict recommend_with_tool returns (audio/image are produced after the last chunk).
+    """
+    sink = result if result is not None else {}
+
+    if is_inappropriate(user_query):
+        sink.update(_result(INAPPROPRIATE_TEXT, None, None, None, None))
+        yield INAPPROPRIATE_TEXT
+        return
+
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    if (FAST_PATH if fast_path is None else fast_path) and not filters:
+        with _timed(timings, "fast_path"):
+            fast = _fast_path_answer(user_query)
+        if fast:
+            yield fast["text"]
+            sink.update(_finalize(fast["text"], fast["picked_title"], fast["picked_score"], tts, gen_image,
+                                  timings=timings))
+            log_interaction(user_query, fast["picked_title"], fast["picked_score"], user_id, "fast", timings, started)
+            return
+
+    scope = _semantic_scope(k, filters, mode, user_id)
+    with _timed(timings, "semantic_cache"):
+        cached, qvec = _semantic_lookup(user_query, scope)
+    if cached:
+        yield cached["text"]
+        sink.update(_finalize(cached["text"], cached["picked_title"], cached["picked_score"], tts, gen_image,
+                              timings=timings))
+        log_interaction(user_query, cached["picked_title"], cached["picked_score"], user_id, "semantic", timings, started)
+        return
+
+    with _timed(timings, "rag"):
+        context = _build_context(search_books(user_query, k=k, filters=filters), user_id, user_query,
+                                 _use_single(mode))
+    user_query = _prepare_query(user_query)
+    temp = float(temperature if temperature is not None else TEMP_DEFAULT)
+    parts: List[str] = []
+    usage: List[Dict] = []
+
+    def _emit(chunk: str) -> str:
+        parts.append(chunk)
+        return chunk
+
+    if _use_single(mode):
+        # Structured output arrives as one JSON object: nothing useful to stream token by token
+        with _timed(timings, "single"):
+            msg = _chat("single", usage, **_single_kwargs(user_query, context, temp)).choices[0].message
+        picked_title, reasons = _parse_single(msg)
+        picked_score = _score_for(picked_title, context)
+        if picked_title:
+            yield _emit(_head_text(picked_title))
+            yield _emit(reasons)
+            with _timed(timings, "summary"):
+                summary = _local_summary(picked_title)
+            yield _emit(_summary_text(summary))
+        else:
+            yield _emit(NO_PICK_TEXT)
+    else:
+        with _timed(timings, "pick"):
+            msg = _chat("pick", usage, **_pick_kwargs(user_query, context, temp)).choices[0].message
+        with _timed(timings, "summary"):
+            picked_title, picked_score, summary = _run_tool_calls(msg, context)
+        if msg.tool_calls:
+            yield _emit(_head_text(picked_title))
+            reasons_kwargs = _reasons_kwargs(user_query, context, picked_title, summary)
+            cached = llm_cache.lookup(reasons_kwargs)
+            if cached is not None:
+                _cache_hit("reasons", usage)
+                yield _emit(cached.choices[0].message.content or "")
+            else:
+                # request -> last token (includes the time the consumer spends between chunks)
+                t_reasons = time.perf_counter()
+                stream = client.chat.completions.create(
+                    **reasons_kwargs, stream=True, stream_options={"include_usage": True}
+                )
+                deltas: List[str] = []
+                for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        deltas.append(delta)
+                        yield _emit(delta)
+                    if getattr(chunk, "usage", None):
+                        record_usage(usage, "reasons", chunk)
+                dt = time.perf_counter() - t_reasons
+                metrics.observe("chatbot.reasons", dt)
+                timings["reasons"] = round(dt * 1000, 2)
+                if llm_cache.LLM_CACHE_ENABLED:
+                    llm_cache.store(reasons_kwargs, llm_cache.completion_from_text(CHAT_MODEL, "".join(deltas)))
+            yield _emit(_summary_text(summary))
+        else:
+            yield _emit(NO_PICK_TEXT)
+
+    cites = _citations_text(context)
+    if cites:
+        yield _emit(cites)
+
+    text = "".join(parts)
+    _semantic_store(qvec, scope, text, picked_title, picked_score)
+    sink.update(_finalize(text, picked_title, picked_score, tts, gen_image, usage, timings))
+    log_interaction(user_query, picked_title, picked_score, user_id, "rag", timings, started, usage)
+
+# -------------------- Async API ------------------------
+# Same pipeline on AsyncOpenAI: the cover image only needs picked_title, so it starts right
+# after the first completion and runs alongside the reasons call; TTS runs in a worker thread.
+
+async def _achat(aclient: AsyncOpenAI, stage: str, usage: List[Dict], **kwargs):
+    resp = await asyncio.to_thread(llm_cache.lookup, kwargs)
+    if resp is not None:
+        _cache_hit(stage, usage)
+        return resp
+    resp = await aclient.chat.completions.create(**kwargs)
+    record_usage(usage, stage, resp)
+    await asyncio.to_thread(llm_cache.store, kwargs, resp)
+    return resp
+
+async def _acover(aclient: AsyncOpenAI, picked_title: str | None, timings: Dict[str, float]) -> Path | None:
+    try:
+        with _timed(timings, "image"):
+            img = await aclient.images.generate(model="gpt-image-1", prompt=_cover_prompt(picked_title),
+                                                size="1024x1024", n=1)
+            return await asyncio.to_thread(_save_cover, img.data[0].b64_json)
+    except Exception:
+        return None
+
+async def _atts(text: str, timings: Dict[str, float]) -> str | None:
+    try:
+        with _timed(timings, "tts"):
+            return await asyncio.to_thread(tts_say, text, ASSETS_DIR)
+    except Exception:
+        return None
+
+async def _afinalize(aclient: AsyncOpenAI, answer: Dict, tts: bool, gen_image: bool, timings: Dict[str, float]) -> Dict:
+    """Result for a ready answer ({text, picked_title, picked_score}): cover and TTS run together."""
+    cover_task = asyncio.create_task(_acover(aclient, answer["picked_title"], timings)) if gen_image else None
+    audio_path = await _atts(answer["text"], timings) if tts else None
+    image_path = await cover_task if cover_task else None
+    return _result(answer["text"], audio_path, image_path, answer["picked_title"], answer["picked_score"])
+
+async def arecommend_with_tool(
+    user_query: str,
+    k: int | None = None,
+    temperature: float | None = None,
+    tts: bool = False,
+    gen_image: bool = False,
+    fast_path: bool | None = None,
+    filters: Dict | None = None,
+    mode: str | None = None,
+    user_id: str | None = None
+) -> Dict:
+    """Async variant of recommend_with_tool (same inputs, same result dict)."""
+    # One client per call: its connection pool is bound to the running loop, and asyncio.run()
+    # makes a new loop each time, so the client (and its sockets) is closed before returning.
+    async with AsyncOpenAI() as aclient:
+        return await _arecommend(aclient, user_query, k, temperature, tts, gen_image, fast_path,
+                                 filters, mode, user_id)
+
+async def _arecommend(
+    aclient: AsyncOpenAI,
+    user_query: str,
+    k: int | None,
+    temperature: float | None,
+    tts: bool,
+    gen_image: bool,
+    fast_path: bool | None,
+    filters: Dict | None,
+    mode: str | None,
+    user_id: str | None
+) -> Dict:
+    if is_inappropriate(user_query):
+        return _result(INAPPROPRIATE_TEXT, None, None, None, None)
+    started = time.perf_counter()
+    timings: Dict[str, float] = {}
+
+    if (FAST_PATH if fast_path is None else fast_path) and not filters:
+        with _timed(timings, "fast_path"):
+            fast = _fast_path_answer(user_query)
+        if fast:
+            out = await _afinalize(aclient, fast, tts, gen_image, timings)
+            log_interaction(user_query, fast["picked_title"], fast["picked_score"], user_id, "fast", timings, started)
+            return out
+
+    scope = _semantic_scope(k, filters, mode, user_id)
+    with _timed(timings, "semantic_cache"):
+        cached, qvec = await asyncio.to_thread(_semantic_lookup, user_query, scope)
+    if cached:
+        out = await _afinalize(aclient, cached, tts, gen_image, timings)
+        log_interaction(user_query, cached["picked_title"], cached["picked_score"], user_id, "semantic", timings, started)
+        return out
+
+    with _timed(timings, "rag"):
+        candidates = await asyncio.to_thread(search_books, user_query, k, filters)
+        context = _build_context(candidates, user_id, user_query, _use_single(mode))
+    user_query = _prepare_query(user_query)
+    temp = float(temperature if temperature is not None else TEMP_DEFAULT)
+
+    usage: List[Dict] = []
+    single = _use_single(mode)
+    if single:
+        with _timed(timings, "single"):
+            first = await _achat(aclient, "single", usage, **_single_kwargs(user_query, context, temp))
+        picked_title, reasons = _parse_single(first.choices[0].message)
+        picked_score = _score_for(picked_title, context)
+    else:
+        with _timed(timings, "pick"):
+            first = await _achat(aclient, "pick", usage, **_pick_kwargs(user_query, context, temp))
+        msg = first.choices[0].message
+        with _timed(timings, "summary"):
+            picked_title, picked_score, summary = _run_tool_calls(msg, context)
+
+    cover_task = asyncio.create_task(_acover(aclient, picked_title, timings)) if gen_image else None
+    try:
+        if single:
+            with _timed(timings, "summary"):
+                summary = await asyncio.to_thread(_local_summary, picked_title) if picked_title else ""
+            text = _compose_text(picked_title, reasons, summary) if picked_title else NO_PICK_TEXT
+        elif msg.tool_calls:
+            with _timed(timings, "reasons"):
+                second = await _achat(
+                    aclient, "reasons", usage, **_reasons_kwargs(user_query, context, picked_title, summary)
+                )
+            text = _compose_text(picked_title, second.choices[0].message.content or "", summary)
+        else:
+            text = NO_PICK_TEXT
+        text = _with_citations(text, context)
+        _semantic_store(qvec, scope, text, picked_title, picked_score)
+
+        audio_path = await _atts(text, timings) if tts and text else None
+        image_path = await cover_task if cover_task else None
+    except BaseException:
+        if cover_task:
+            cover_task.cancel()
+        raise
+
+    log_interaction(user_query, picked_title, picked_score, user_id, "rag", timings, started, usage)
+    return _result(text, audio_path, image_path, picked_title, picked_score, usage)
@@ -0,0 +1,142 @@
+# app/embed_cache.py
+"""
+Persistent, content-addressed cache for OpenAI embeddings (SQLite).
+
+- Key: sha256(model + text) -> the same text embedded with another model is a miss
+- Value: float32 vector packed as a BLOB (4 bytes / dimension)
+- LRU eviction on `last_used` once the cache holds more than EMBED_CACHE_MAX_ITEMS
+- Duplicate texts inside one batch are sent to the API only once
+
+Shared by rag.embed() (query path) and init_vector_store._embed_batch() (ingest path).
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE", "true").lower() in {"1", "true", "yes", "y"}
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "./data/embed_cache.sqlite")
+EMBED_CACHE_MAX_ITEMS = int(os.getenv("EMBED_CACHE_MAX_ITEMS", "200000"))
+
+# -------------------- Helpers ----------------------------
+
+def _key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+def _pack(vec: Sequence[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+def _unpack(blob: bytes) -> List[float]:
+    a = array("f")
+    a.frombytes(blob)
+    return a.tolist()
+
+# -------------------- Cache ------------------------------
+
+class EmbeddingCache:
+    """Thread-safe SQLite store: key -> float32 vector, with LRU eviction."""
+
+    def __init__(self, path: str | Path = EMBED_CACHE_PATH, max_items: int = EMBED_CACHE_MAX_ITEMS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, vec BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_lru ON embeddings(last_used)")
+        self._db.commit()
+
+    def get_many(self, model: str, texts: Sequence[str]) -> Dict[str, List[float]]:
+        """Return {text: vector} for the texts already cached; touches their LRU stamp."""
+        keys = {_key(model, t): t for t in texts}
+        if not keys:
+            return {}
+        out: Dict[str, List[float]] = {}
+        with self._lock:
+            kl = list(keys)
+            for start in range(0, len(kl), 500):  # stay under SQLite's variable limit
+                chunk = kl[start:start + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for k, blob in rows:
+                    out[keys[k]] = _unpack(blob)
+            if out:
+                now = time.time()
+                self._db.executemany(
+                    "UPDATE embeddings SET last_used=? WHERE key=?",
+                    [(now, _key(model, t)) for t in out],
+                )
+                self._db.commit()
+        return out
+
+    def put_many(self, model: str, items: Dict[str, Sequence[float]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [(_key(model, t), model, _pack(v), now) for t, v in items.items()]
+        with self._lock:
+            # INSERT opens the write transaction, so the COUNT below sees rows committed by
+            # other processes (ingest workers, the UI) and the trim is exact, not a local guess
+            self._db.executemany(
+                "INSERT OR IGNORE INTO embeddings(key, model, vec, last_used) VALUES (?,?,?,?)", rows
+            )
+            count = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_items:
+                self._db.execute(
+                    "DELETE FROM embeddings WHERE key IN ("
+                    " SELECT key FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_items,),
+                )
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> EmbeddingCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+# -------------------- Public API -------------------------
+
+def cached_embed(client: Any, model: str, texts: Sequence[str]) -> List[List[float]]:
+    """
+    Embed `texts` with `client.embeddings.create`, serving repeats from the on-disk cache.
+    Output order matches `texts`; duplicates in the batch cost one API slot.
+    """
+    uniq = list(dict.fromkeys(texts))
+    if not uniq:
+        return []
+
+    found: Dict[str, List[float]] = get_cache().get_many(model, uniq) if EMBED_CACHE_ENABLED else {}
+    missing = [t for t in uniq if t not in found]
+    if missing:
+        resp = client.embeddings.create(model=model, input=missing)
+        fresh = {t: d.embedding for t, d in zip(missing, resp.data)}
+        if EMBED_CACHE_ENABLED:
+            get_cache().put_many(model, fresh)
+        found.update(fresh)
+    return [found[t] for t in texts]
@@ -0,0 +1,51 @@
+# app/index_version.py
+"""
+Collection version stamp shared by the indexer and the query side.
+
+build_collection() bumps it after every (re)index; caches that depend on retrieval results
+(rag's query-result cache, semantic answer cache, ...) store the stamp with each entry and
+treat a mismatch as a miss. Reading it is a stat() plus, only when the file changed, one tiny read.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import uuid
+import threading
+from pathlib import Path
+from typing import Optional, Tuple
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+CHROMA_DIR = os.getenv("CHROMA_DIR", "./chroma")
+INDEX_VERSION_PATH = os.getenv("INDEX_VERSION_PATH", os.path.join(CHROMA_DIR, "index_version"))
+
+_lock = threading.Lock()
+_seen: Tuple[Optional[int], str] = (None, "")  # (mtime_ns, version)
+
+def bump_index_version() -> str:
+    """Write a fresh version stamp (called by init_vector_store after a build)."""
+    p = Path(INDEX_VERSION_PATH)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    version = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    tmp = p.with_name(p.name + ".tmp")
+    tmp.write_text(version, encoding="utf-8")
+    os.replace(tmp, p)
+    return version
+
+def current_index_version() -> str:
+    """Current stamp, or '' if the index was never built with a version file."""
+    global _seen
+    try:
+        mtime = os.stat(INDEX_VERSION_PATH).st_mtime_ns
+    except OSError:
+        return ""
+    if mtime != _seen[0]:
+        with _lock:
+            try:
+                _seen = (mtime, Path(INDEX_VERSION_PATH).read_text(encoding="utf-8").strip())
+            except OSError:
+                return ""
+    return _seen[1]
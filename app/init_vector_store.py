@@ -1,11 +1,16 @@
 # app/init_vector_store.py
 """
-(Re)build the ChromaDB vector store from data/book_summaries.json.
+(Re)build the ChromaDB vector store from data/book_summaries.json (or a .jsonl catalog).
 
 - Expects each item to have: title, author, year, genres[list], themes[list], summary[str]
 - Embeds a rich text:  "{title}\n{summary}\nGenres: ...\nThemes: ..."
 - Stores the summary as the document (nice for snippets)
-- Metadata must be scalars => genres/themes saved as comma-separated strings
+- Metadata must be scalars => genres/themes saved as comma-separated strings,
+  plus one boolean key per facet (genre_<slug>, theme_<slug>) for `where` filtering
+- Ids are derived from (title, author), so they survive reordering/inserts in the JSON
+- RESET_COLLECTION=false => incremental diff by per-record fingerprint (metadata "fp")
+- The catalog is streamed: memory is bounded by the in-flight batches, not the file size
+- EXPORT_NUMPY_INDEX (default: on when RAG_BACKEND=numpy) also writes the NumPy snapshot
 """
 
 from __future__ import annotations
@@ -14,15 +19,28 @@ import os
 import json
 import time
 import hashlib
+import threading
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from itertools import islice
+from typing import Deque, Iterable, Iterator, List, Dict, Any, Tuple
 
 from dotenv import load_dotenv
 load_dotenv(override=True)
 
-from openai import OpenAI
+from openai import OpenAI, RateLimitError
 import chromadb
 
+try:
+    from .embed_cache import cached_embed
+    from .catalog import facet_key, iter_items
+    from .index_version import bump_index_version, current_index_version
+except ImportError:
+    from embed_cache import cached_embed
+    from catalog import facet_key, iter_items
+    from index_version import bump_index_version, current_index_version
+
 # -------------------- Env & constants --------------------
 
 DATA_JSON = os.getenv("DATA_JSON", "./data/book_summaries.json")
@@ -33,6 +51,12 @@ EMBED_MODEL = os.getenv(
 )
 BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
 RESET_COLLECTION = os.getenv("RESET_COLLECTION", "true").lower() in {"1", "true", "yes", "y"}
+EMBED_CONCURRENCY = max(1, int(os.getenv("EMBED_CONCURRENCY", "4")))  # embedding requests in flight
+EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "6"))           # per batch, on HTTP 429
+RAG_BACKEND = os.getenv("RAG_BACKEND", "chroma").strip().lower()
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", "./vector_index")
+# Also write the mmap-able NumPy snapshot used by RAG_BACKEND=numpy (see vector_index.py)
+EXPORT_NUMPY_INDEX = os.getenv("EXPORT_NUMPY_INDEX", str(RAG_BACKEND == "numpy")).lower() in {"1", "true", "yes", "y"}
 
 client_oai = OpenAI()
 
@@ -45,44 +69,42 @@ def _slug(s: str) -> str:
         base = hashlib.sha1(s.encode("utf-8")).hexdigest()[:8]
     return base[:64]
 
-def _load_data(path: str | Path) -> List[Dict[str, Any]]:
-    p = Path(path)
-    if not p.exists():
-        raise FileNotFoundError(f"DATA_JSON file not found: {p}")
-    data = json.loads(p.read_text(encoding="utf-8"))
-    if not isinstance(data, list):
-        raise ValueError("DATA_JSON must be a JSON array")
-
-    out: List[Dict[str, Any]] = []
-    for item in data:
-        title = (item.get("title") or "").strip()
-        author = (item.get("author") or "").strip()
-        year = item.get("year")
-        genres = item.get("genres") or []
-        themes = item.get("themes") or []
-        summary = (item.get("summary") or "").strip()
-
-        if not title or not summary:
-            continue
-
-        if not isinstance(genres, list): genres = [str(genres)]
-        if not isinstance(themes, list): themes = [str(themes)]
-        try:
-            year = int(year) if year is not None else None
-        except Exception:
-            year = None
-
-        out.append({
-            "title": title,
-            "author": author,
-            "year": year,
-            "genres": [str(g).strip() for g in genres if str(g).strip()],
-            "themes": [str(t).strip() for t in themes if str(t).strip()],
-            "summary": summary
-        })
-    if not out:
-        raise ValueError("DATA_JSON parsed but contains no valid items.")
-    return out
+def _clean_item(item: Any) -> Dict[str, Any] | None:
+    """Validate/normalize one raw catalog element; None if it should be skipped."""
+    if not isinstance(item, dict):
+        return None
+    title = (item.get("title") or "").strip()
+    author = (item.get("author") or "").strip()
+    year = item.get("year")
+    genres = item.get("genres") or []
+    themes = item.get("themes") or []
+    summary = (item.get("summary") or "").strip()
+
+    if not title or not summary:
+        return None
+
+    if not isinstance(genres, list): genres = [str(genres)]
+    if not isinstance(themes, list): themes = [str(themes)]
+    try:
+        year = int(year) if year is not None else None
+    except Exception:
+        year = None
+
+    return {
+        "title": title,
+        "author": author,
+        "year": year,
+        "genres": [str(g).strip() for g in genres if str(g).strip()],
+        "themes": [str(t).strip() for t in themes if str(t).strip()],
+        "summary": summary
+    }
+
+def _iter_data(path: str | Path) -> Iterator[Dict[str, Any]]:
+    """Stream valid records from a JSON array or JSONL catalog (see catalog.py)."""
+    for item in iter_items(path):
+        rec = _clean_item(item)
+        if rec is not None:
+            yield rec
 
 def _compose_index_text(rec: Dict[str, Any]) -> str:
     genres = ", ".join(rec.get("genres", []))
@@ -90,21 +112,140 @@ def _compose_index_text(rec: Dict[str, Any]) -> str:
     return f"{rec['title']}\n{rec['summary']}\nGenres: {genres}\nThemes: {themes}".strip()
 
 def _embed_batch(texts: List[str]) -> List[List[float]]:
-    resp = client_oai.embeddings.create(model=EMBED_MODEL, input=texts)
-    return [d.embedding for d in resp.data]
+    return cached_embed(client_oai, EMBED_MODEL, texts)
 
-# -------------------- Build collection -------------------
+# -------------------- Pipelined ingest -------------------
 
-def build_collection():
-    data = _load_data(DATA_JSON)
+Record = Tuple[str, Dict[str, Any], str, str]  # (id, metadata, index_text, document)
 
-    # Build records
-    seen: set[str] = set()
-    records: List[Tuple[str, Dict[str, Any], str, str]] = []
-    for i, rec in enumerate(data):
-        rid = f"book-{i:03d}-{_slug(rec['title'])}"
+class _Backoff:
+    """Delay shared by all embedding workers: doubles on 429, decays on success."""
+
+    def __init__(self, floor: float = 0.5, ceiling: float = 30.0):
+        self.floor, self.ceiling = floor, ceiling
+        self.delay = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        if self.delay:
+            time.sleep(self.delay)
+
+    def penalize(self, retry_after: float | None = None) -> None:
+        with self._lock:
+            self.delay = min(self.ceiling, max(self.delay * 2, self.floor, retry_after or 0.0))
+
+    def relax(self) -> None:
+        with self._lock:
+            self.delay = self.delay / 2 if self.delay > 0.05 else 0.0
+
+def _retry_after(err: RateLimitError) -> float | None:
+    try:
+        return float(err.response.headers.get("retry-after"))
+    except Exception:
+        return None
+
+def _embed_with_retry(texts: List[str], backoff: _Backoff) -> List[List[float]]:
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        backoff.wait()
+        try:
+            vectors = _embed_batch(texts)
+            backoff.relax()
+            return vectors
+        except RateLimitError as e:
+            if attempt == EMBED_MAX_RETRIES:
+                raise
+            backoff.penalize(_retry_after(e))
+            print(f"  ! 429 rate limited — backing off {backoff.delay:.1f}s (attempt {attempt + 1})")
+    raise RuntimeError("unreachable")
+
+def _batched(items: Iterable[Record], n: int) -> Iterator[List[Record]]:
+    it = iter(items)
+    while batch := list(islice(it, n)):
+        yield batch
+
+def _ingest(collection, records: Iterable[Record]) -> int:
+    """
+    Embed + upsert `records` with up to EMBED_CONCURRENCY embedding calls in flight,
+    while a single writer thread upserts finished batches into Chroma.
+    At most ~2x EMBED_CONCURRENCY batches are held in memory. Returns the number upserted.
+    """
+    backoff = _Backoff()
+    inflight: Deque[Tuple[List[Record], Future]] = deque()
+    writes: Deque[Future] = deque()
+    done = 0
+    t0 = time.time()
+
+    def _upsert(batch: List[Record], vectors: List[List[float]]) -> int:
+        collection.upsert(
+            ids=[r[0] for r in batch],
+            embeddings=vectors,
+            metadatas=[r[1] for r in batch],
+            documents=[r[3] for r in batch],
+        )
+        return len(batch)
+
+    def _drain_one() -> None:
+        nonlocal done
+        batch, fut = inflight.popleft()
+        writes.append(writer.submit(_upsert, batch, fut.result()))
+        while writes and (writes[0].done() or len(writes) > EMBED_CONCURRENCY):
+            done += writes.popleft().result()
+            dt = max(time.time() - t0, 1e-6)
+            print(f"  • {done} upserted — {done / dt:.1f} items/s")
+
+    with ThreadPoolExecutor(EMBED_CONCURRENCY, thread_name_prefix="embed") as pool, \
+         ThreadPoolExecutor(1, thread_name_prefix="upsert") as writer:
+        for batch in _batched(records, BATCH_SIZE):
+            inflight.append((batch, pool.submit(_embed_with_retry, [r[2] for r in batch], backoff)))
+            if len(inflight) >= EMBED_CONCURRENCY:
+                _drain_one()
+        while inflight:
+            _drain_one()
+        while writes:
+            done += writes.popleft().result()
+
+    dt = max(time.time() - t0, 1e-6)
+    print(f"  • {done} upserted — {done / dt:.1f} items/s (avg)")
+    return done
+
+# -------------------- Records ----------------------------
+
+def _record_id(rec: Dict[str, Any]) -> str:
+    """Stable, content-derived id: same (title, author) -> same id, regardless of list position."""
+    key = f"{rec['title'].strip().casefold()}|{rec['author'].strip().casefold()}"
+    return f"book-{_slug(rec['title'])}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:10]}"
+
+def _fingerprint(index_text: str, metadata: Dict[str, Any]) -> str:
+    """Hash of everything we write for a record; unchanged fingerprint => nothing to re-embed."""
+    payload = json.dumps([index_text, metadata], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+def _existing_fingerprints(collection) -> Dict[str, str]:
+    """{id: fp} for everything already stored (paged, so large collections don't load at once)."""
+    out: Dict[str, str] = {}
+    offset = 0
+    page = 1000
+    while True:
+        res = collection.get(include=["metadatas"], limit=page, offset=offset)
+        ids = res.get("ids") or []
+        for rid, meta in zip(ids, res.get("metadatas") or []):
+            out[rid] = (meta or {}).get("fp") or ""
+        if len(ids) < page:
+            return out
+        offset += page
+
+# -------------------- Build collection -------------------
+
+def iter_records(path: str | Path = DATA_JSON, seen: set[str] | None = None) -> Iterator[Record]:
+    """(id, metadata, index_text, document) per catalog item, streamed; ids are made unique via `seen`."""
+    seen = set() if seen is None else seen
+    for rec in _iter_data(path):
+        rid = _record_id(rec)
         if rid in seen:
-            rid = f"{rid}-{hashlib.sha1((rec['title']+str(i)).encode()).hexdigest()[:6]}"
+            n = 2
+            while f"{rid}-{n}" in seen:
+                n += 1
+            rid = f"{rid}-{n}"
         seen.add(rid)
 
         index_text = _compose_index_text(rec)
@@ -117,8 +258,21 @@ def build_collection():
             "year": rec["year"],  # int or None is fine
             "genres": ", ".join(rec["genres"]),
             "themes": ", ".join(rec["themes"]),
+            "author_key": rec["author"].casefold(),
         }
-        records.append((rid, metadata, index_text, document))
+        # Filterable facets: one boolean key per genre/theme (genre_fantasy=True, ...)
+        metadata.update({facet_key("genre", g): True for g in rec["genres"]})
+        metadata.update({facet_key("theme", t): True for t in rec["themes"]})
+        metadata["fp"] = _fingerprint(index_text + "\n" + document, metadata)
+        yield rid, metadata, index_text, document
+
+def build_collection():
+    """
+    RESET_COLLECTION=true  -> drop the collection and embed every record.
+    RESET_COLLECTION=false -> incremental: embed/upsert only new or changed records
+                              (by fingerprint) and delete records no longer in DATA_JSON.
+    """
+    seen: set[str] = set()
 
     # Create Chroma client / collection
     Path(CHROMA_DIR).mkdir(parents=True, exist_ok=True)
@@ -132,31 +286,50 @@ def build_collection():
 
     collection = chroma_client.get_or_create_collection(name=COLLECTION_NAME)
 
-    # Upsert in batches
-    total = len(records)
-    print(f"[init_vector_store] Upserting {total} items to collection '{COLLECTION_NAME}' at {CHROMA_DIR}")
+    # Records stream straight from DATA_JSON into embedding batches; in incremental
+    # mode only new/changed ones pass the filter (existing = {id: fp}, ids only).
+    existing: Dict[str, str] = {} if RESET_COLLECTION else _existing_fingerprints(collection)
+    unchanged = 0
+
+    def _todo() -> Iterator[Record]:
+        nonlocal unchanged
+        for r in iter_records(DATA_JSON, seen):
+            if existing.get(r[0]) == r[1]["fp"]:
+                unchanged += 1
+            else:
+                yield r
+
+    print(f"[init_vector_store] Streaming {DATA_JSON} into collection '{COLLECTION_NAME}' at {CHROMA_DIR} "
+          f"(mode={'reset' if RESET_COLLECTION else 'incremental'}, "
+          f"concurrency={EMBED_CONCURRENCY}, batch={BATCH_SIZE})")
     t0 = time.time()
 
-    for start in range(0, total, BATCH_SIZE):
-        end = min(start + BATCH_SIZE, total)
-        batch = records[start:end]
-        ids = [r[0] for r in batch]
-        metadatas = [r[1] for r in batch]
-        index_texts = [r[2] for r in batch]
-        documents = [r[3] for r in batch]
+    # Embed + upsert, pipelined
+    total = _ingest(collection, _todo())
+    if not seen:
+        raise ValueError("DATA_JSON parsed but contains no valid items.")
 
-        vectors = _embed_batch(index_texts)
+    # Whatever was stored but not seen in this pass has been removed from DATA_JSON
+    stale = [rid for rid in existing if rid not in seen]
+    for start in range(0, len(stale), BATCH_SIZE):
+        collection.delete(ids=stale[start:start + BATCH_SIZE])
 
-        collection.upsert(
-            ids=ids,
-            embeddings=vectors,
-            metadatas=metadatas,
-            documents=documents,
-        )
-        print(f"  • [{start:>3}-{end:>3}] upserted")
+    if EXPORT_NUMPY_INDEX:
+        try:
+            from .vector_index import export_from_collection
+        except ImportError:
+            from vector_index import export_from_collection
+        rows = export_from_collection(collection, NUMPY_INDEX_DIR, model=EMBED_MODEL)
+        print(f"[init_vector_store] NumPy index: {rows} rows -> {NUMPY_INDEX_DIR}")
+
+    # Invalidate query-side caches keyed on the collection version, only if the data changed
+    # (a no-op incremental run must not flush every process' result / semantic cache)
+    version = bump_index_version() if total or stale else current_index_version()
 
     dt = time.time() - t0
-    print(f"[init_vector_store] DONE in {dt:.2f}s — {total} items.")
+    print(f"[init_vector_store] version={version}")
+    print(f"[init_vector_store] DONE in {dt:.2f}s — {total} upserted, {unchanged} unchanged, "
+          f"{len(stale)} deleted.")
 
 if __name__ == "__main__":
     build_collection()
@@ -0,0 +1,158 @@
+# app/interaction_log.py
+"""
+Non-blocking interaction log (JSONL) written by a background thread.
+
+- log_event(record) only puts the dict on a queue; the request never touches the disk
+- The writer drains the queue in batches (LOG_BATCH_SIZE records or every LOG_FLUSH_SECONDS)
+  and appends them to LOG_JSONL_PATH with one write + flush per batch
+- Rotation: when the file exceeds LOG_MAX_BYTES or is older than LOG_ROTATE_SECONDS it is
+  renamed to <name>.<UTC timestamp>.jsonl; only the newest LOG_KEEP_FILES rotations are kept
+- At interpreter exit the queue is drained and the file flushed (atexit)
+- If the queue is full (writer stuck / disk slow), records are dropped and counted, never blocking
+
+One JSON object per line, e.g.
+  {"ts": "...", "user_id": "...", "route": "rag", "query": "...", "picked_title": "...",
+   "picked_score": 0.61, "latency_ms": {"rag": 180.2, "pick": 640.5, ..., "total": 1510.3},
+   "tokens": {"prompt": 812, "completion": 95, "cached": 0}}
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import queue
+import atexit
+import datetime
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+LOG_JSONL_PATH = os.getenv("LOG_JSONL_PATH", "./data/interactions.jsonl")
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "64"))
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", "1.0"))
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(20 * 1024 * 1024)))
+LOG_ROTATE_SECONDS = float(os.getenv("LOG_ROTATE_SECONDS", "86400"))   # 0 = size-based only
+LOG_KEEP_FILES = int(os.getenv("LOG_KEEP_FILES", "14"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+_STOP = object()
+
+class InteractionLogger:
+    """Queue + daemon writer thread; safe to call log() from any thread."""
+
+    def __init__(self, path: str | Path = LOG_JSONL_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._q: "queue.Queue[Any]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        self._opened_at = self._file_start()
+        self.dropped = 0
+        self.written = 0
+        self._thread = threading.Thread(target=self._run, name="interaction-log", daemon=True)
+        self._thread.start()
+
+    def _file_start(self) -> float:
+        """
+        When the current file was started: the "ts" of its first record. (st_ctime is only the
+        creation time on Windows; on POSIX every append moves it, so it can't age a file.)
+        """
+        try:
+            with self.path.open("r", encoding="utf-8") as f:
+                ts = json.loads(f.readline())["ts"]
+            return datetime.datetime.fromisoformat(ts).replace(tzinfo=datetime.timezone.utc).timestamp()
+        except (OSError, ValueError, KeyError, TypeError):
+            return time.time()
+
+    def log(self, record: Dict[str, Any]) -> None:
+        try:
+            self._q.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self, timeout: float = 5.0) -> None:
+        """Block until everything queued so far is on disk (tests, shutdown)."""
+        done = threading.Event()
+        self.log({"__flush__": done})
+        done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread.is_alive():
+            try:
+                self._q.put(_STOP, timeout=timeout)
+            except queue.Full:
+                return
+            self._thread.join(timeout)
+
+    # -------------------- writer thread --------------------
+
+    def _rotate_if_needed(self) -> None:
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            return
+        too_old = LOG_ROTATE_SECONDS > 0 and time.time() - self._opened_at > LOG_ROTATE_SECONDS
+        if size < LOG_MAX_BYTES and not (too_old and size):
+            return
+        stamp = datetime.datetime.utcnow().strftime("%Y%m%dT%H%M%S%f")
+        self.path.rename(self.path.with_name(f"{self.path.stem}.{stamp}{self.path.suffix}"))
+        self._opened_at = time.time()
+        old = sorted(self.path.parent.glob(f"{self.path.stem}.*{self.path.suffix}"))
+        for p in old[:max(0, len(old) - LOG_KEEP_FILES)]:
+            p.unlink(missing_ok=True)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        if not batch:
+            return
+        self._rotate_if_needed()
+        if not self.path.exists():
+            self._opened_at = time.time()  # a new file starts its rotation window now
+        lines = "".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in batch)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(lines)
+        self.written += len(batch)
+
+    def _run(self) -> None:
+        batch: List[Dict[str, Any]] = []
+        flushes: List[threading.Event] = []
+        deadline = time.monotonic() + LOG_FLUSH_SECONDS
+        stop = False
+        while not stop:
+            try:
+                item = self._q.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is _STOP:
+                    stop = True
+                elif "__flush__" in item:
+                    flushes.append(item["__flush__"])
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+            if stop or flushes or len(batch) >= LOG_BATCH_SIZE or time.monotonic() >= deadline:
+                try:
+                    self._write(batch)
+                except OSError:
+                    self.dropped += len(batch)
+                batch = []
+                for ev in flushes:
+                    ev.set()
+                flushes = []
+                deadline = time.monotonic() + LOG_FLUSH_SECONDS
+
+_logger: Optional[InteractionLogger] = None
+_logger_lock = threading.Lock()
+
+def get_logger() -> InteractionLogger:
+    global _logger
+    with _logger_lock:
+        if _logger is None:
+            _logger = InteractionLogger()
+            atexit.register(_logger.close)
+        return _logger
+
+def log_event(record: Dict[str, Any]) -> None:
+    """Queue one record (adds "ts" if missing); returns immediately."""
+    record.setdefault("ts", datetime.datetime.utcnow().isoformat())
+    get_logger().log(record)
@@ -0,0 +1,177 @@
+# app/llm_cache.py
+"""
+Opt-in on-disk cache for chat completions (SQLite), for the low-temperature calls in chatbot.py.
+
+- Key: sha256 of the canonical JSON of the request (model, messages, tools, tool_choice,
+  response_format, temperature, max_tokens, ...); transport-only args (stream) are ignored
+- Value: the ChatCompletion as JSON, rebuilt with ChatCompletion.model_validate_json on a hit
+- Only calls with temperature <= LLM_CACHE_MAX_TEMPERATURE are cached (replays must be meaningful)
+- TTL per entry, LRU eviction above LLM_CACHE_MAX_ITEMS, per-entry hit counter (llm_cache_stats)
+
+A hit skips the API entirely, so it costs no tokens (the usage row is recorded as zero).
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE", "false").lower() in {"1", "true", "yes", "y"}
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./data/llm_cache.sqlite")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))             # seconds
+LLM_CACHE_MAX_ITEMS = int(os.getenv("LLM_CACHE_MAX_ITEMS", "5000"))
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.3"))
+
+_TRANSPORT_ARGS = {"stream", "stream_options", "timeout", "extra_headers", "extra_query", "extra_body"}
+
+# -------------------- Helpers ----------------------------
+
+def request_key(kwargs: Dict[str, Any]) -> Optional[str]:
+    """Canonical hash of a chat.completions.create request, or None if it must not be cached."""
+    if float(kwargs.get("temperature", 1.0)) > LLM_CACHE_MAX_TEMPERATURE or int(kwargs.get("n", 1)) != 1:
+        return None
+    body = {k: v for k, v in kwargs.items() if k not in _TRANSPORT_ARGS}
+    canon = json.dumps(body, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(canon.encode("utf-8")).hexdigest()
+
+def completion_from_text(model: str, text: str) -> Any:
+    """Plain assistant reply as a ChatCompletion (used to store a streamed answer)."""
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate({
+        "id": "cached-" + hashlib.sha1(text.encode("utf-8")).hexdigest()[:16],
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": "stop",
+                     "message": {"role": "assistant", "content": text}}],
+    })
+
+# -------------------- Cache ------------------------------
+
+class CompletionCache:
+    """Thread-safe SQLite store: request hash -> ChatCompletion JSON, with TTL + LRU eviction."""
+
+    def __init__(self, path: str | Path = LLM_CACHE_PATH, max_items: int = LLM_CACHE_MAX_ITEMS,
+                 ttl: float = LLM_CACHE_TTL):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_items = max_items
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS completions ("
+            " key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_completions_lru ON completions(last_used)")
+        self._db.commit()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        """Stored response JSON for `key` (None if missing or older than the TTL)."""
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT response, created FROM completions WHERE key=?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._db.execute("DELETE FROM completions WHERE key=?", (key,))
+                    self._db.commit()
+                self._stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE completions SET last_used=?, hits=hits+1 WHERE key=?", (now, key))
+            self._db.commit()
+            self._stats["hits"] += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response_json: str) -> None:
+        now = time.time()
+        with self._lock:
+            # the upsert opens the write transaction, so COUNT sees other processes' rows too
+            self._db.execute(
+                "INSERT INTO completions(key, model, response, created, last_used) VALUES (?,?,?,?,?)"
+                " ON CONFLICT(key) DO UPDATE SET response=excluded.response, created=excluded.created,"
+                " last_used=excluded.last_used",
+                (key, model, response_json, now, now),
+            )
+            count = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            if count > self.max_items:
+                self._db.execute(
+                    "DELETE FROM completions WHERE key IN ("
+                    " SELECT key FROM completions ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_items,),
+                )
+            self._db.commit()
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT key, model, hits, created FROM completions ORDER BY hits DESC LIMIT ?", (top,)
+            ).fetchall()
+            size = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+            total = self._stats["hits"] + self._stats["misses"]
+            return {
+                "size": size,
+                "hits": self._stats["hits"],
+                "misses": self._stats["misses"],
+                "hit_rate": round(self._stats["hits"] / total, 4) if total else 0.0,
+                "top": [{"key": k[:12], "model": m, "hits": h, "age_s": round(time.time() - c)}
+                        for k, m, h, c in rows],
+            }
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+_cache: CompletionCache | None = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> CompletionCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = CompletionCache()
+        return _cache
+
+# -------------------- Public API -------------------------
+
+def lookup(kwargs: Dict[str, Any]) -> Optional[Any]:
+    """Cached ChatCompletion for this request, or None (also None when the cache is off)."""
+    if not LLM_CACHE_ENABLED:
+        return None
+    key = request_key(kwargs)
+    if key is None:
+        return None
+    raw = get_cache().get(key)
+    if raw is None:
+        return None
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate_json(raw)
+
+def store(kwargs: Dict[str, Any], resp: Any) -> None:
+    if not LLM_CACHE_ENABLED:
+        return
+    key = request_key(kwargs)
+    if key is None:
+        return
+    try:
+        raw = resp.model_dump_json()
+    except AttributeError:
+        return  # not a pydantic response (e.g. a test double) -> nothing to persist
+    get_cache().put(key, str(kwargs.get("model", "")), raw)
+
+def llm_cache_stats(top: int = 10) -> Dict[str, Any]:
+    if not LLM_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_cache().stats(top)}
@@ -0,0 +1,226 @@
+# app/metrics.py
+"""
+Lightweight in-process latency metrics for the recommend pipeline.
+
+- span(name) / @timed(name): time a block or a function into the histogram `name` (seconds)
+- Each histogram keeps cumulative Prometheus buckets (+ sum/count) and the last METRICS_WINDOW
+  samples, from which p50 / p95 / p99 are computed exactly
+- snapshot(): {name: {count, sum, p50, p95, p99, ...}} for the Streamlit debug panel
+- prometheus_text(): text exposition format, served by token_server.py at GET /metrics
+
+The UI and token_server run in different processes, so every process also dumps its buckets to
+METRICS_DIR/<pid>.json (at most every METRICS_FLUSH_SECONDS); prometheus_text() merges those
+files with its own registry. Percentiles of the merged view are estimated from the buckets.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import math
+import time
+import atexit
+import bisect
+import functools
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+METRICS_ENABLED = os.getenv("METRICS", "true").lower() in {"1", "true", "yes", "y"}
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "2048"))          # samples kept per stage for pXX
+METRICS_DIR = os.getenv("METRICS_DIR", "./data/metrics")             # "" disables the snapshot files
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+METRICS_STALE_SECONDS = float(os.getenv("METRICS_STALE_SECONDS", "3600"))
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+METRIC_NAME = "smart_librarian_stage_seconds"
+
+# -------------------- Histogram --------------------------
+
+def _percentile(sorted_vals: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_vals:
+        return 0.0
+    i = min(len(sorted_vals) - 1, max(0, math.ceil(q * len(sorted_vals)) - 1))
+    return float(sorted_vals[i])
+
+def _bucket_quantile(counts: Sequence[int], q: float) -> float:
+    """Estimate a quantile from per-bucket counts (linear inside the bucket, like histogram_quantile)."""
+    total = sum(counts)
+    if total == 0:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, c in enumerate(counts):
+        if seen + c >= rank and c:
+            lo = BUCKETS[i - 1] if i > 0 else 0.0
+            if i >= len(BUCKETS):
+                return BUCKETS[-1]
+            return lo + (BUCKETS[i] - lo) * (rank - seen) / c
+        seen += c
+    return BUCKETS[-1]
+
+class Histogram:
+    """Not thread-safe by itself; the Registry lock guards it."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent: deque = deque(maxlen=METRICS_WINDOW)
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        vals = sorted(self.recent)
+        out = {"count": self.count, "sum": round(self.sum, 6),
+               "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+               "max": round(vals[-1], 6) if vals else 0.0}
+        for q in QUANTILES:
+            out[f"p{int(q * 100)}"] = round(_percentile(vals, q), 6)
+        return out
+
+# -------------------- Registry ---------------------------
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hists: Dict[str, Histogram] = {}
+        self._last_dump = 0.0
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            h = self._hists.get(name)
+            if h is None:
+                h = self._hists[name] = Histogram()
+            h.observe(seconds)
+            due = METRICS_DIR and time.monotonic() - self._last_dump >= METRICS_FLUSH_SECONDS
+            if due:
+                self._last_dump = time.monotonic()
+        if due:
+            self.dump()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: h.summary() for name, h in sorted(self._hists.items())}
+
+    def buckets(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {name: {"counts": list(h.counts), "sum": h.sum, "count": h.count}
+                    for name, h in self._hists.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._hists.clear()
+
+    def dump(self) -> None:
+        """Write this process' buckets to METRICS_DIR/<pid>.json (atomic replace); no-op if empty."""
+        buckets = self.buckets()
+        if not METRICS_DIR or not buckets:
+            return
+        try:
+            d = Path(METRICS_DIR)
+            d.mkdir(parents=True, exist_ok=True)
+            tmp = d / f"{os.getpid()}.json.tmp"
+            tmp.write_text(json.dumps({"pid": os.getpid(), "ts": time.time(), "buckets": buckets}),
+                           encoding="utf-8")
+            os.replace(tmp, d / f"{os.getpid()}.json")
+        except OSError:
+            pass
+
+REGISTRY = Registry()
+if METRICS_ENABLED and METRICS_DIR:
+    atexit.register(REGISTRY.dump)
+
+# -------------------- Public API -------------------------
+
+def observe(name: str, seconds: float) -> None:
+    if METRICS_ENABLED:
+        REGISTRY.observe(name, seconds)
+
+@contextmanager
+def span(name: str, sink: Optional[Dict[str, float]] = None, key: Optional[str] = None) -> Iterator[None]:
+    """Time the block into histogram `name`; also add the milliseconds to sink[key or name] if given."""
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        dt = time.perf_counter() - t0
+        observe(name, dt)
+        if sink is not None:
+            k = key or name
+            sink[k] = round(sink.get(k, 0.0) + dt * 1000, 2)
+
+def timed(name: str) -> Callable:
+    """Decorator form of span()."""
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+def snapshot() -> Dict[str, Dict[str, Any]]:
+    """Per-stage count / sum / mean / max / p50 / p95 / p99 (seconds) for this process."""
+    return REGISTRY.snapshot()
+
+def _merged_buckets(include_files: bool) -> Dict[str, Dict[str, Any]]:
+    merged = REGISTRY.buckets()
+    if not (include_files and METRICS_DIR and Path(METRICS_DIR).is_dir()):
+        return merged
+    now = time.time()
+    for f in Path(METRICS_DIR).glob("*.json"):
+        if f.stem == str(os.getpid()):
+            continue  # our own registry is already in `merged`, fresher than the file
+        try:
+            data = json.loads(f.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        if now - float(data.get("ts", 0)) > METRICS_STALE_SECONDS:
+            try:
+                f.unlink(missing_ok=True)  # dead (or long idle) process: a live one rewrites its file
+            except OSError:
+                pass
+            continue
+        for name, b in (data.get("buckets") or {}).items():
+            m = merged.setdefault(name, {"counts": [0] * (len(BUCKETS) + 1), "sum": 0.0, "count": 0})
+            m["counts"] = [x + y for x, y in zip(m["counts"], b["counts"])]
+            m["sum"] += b["sum"]
+            m["count"] += b["count"]
+    return merged
+
+def prometheus_text(include_files: bool = True) -> str:
+    """Prometheus text exposition (histogram + estimated quantile gauges) for all stages."""
+    merged = _merged_buckets(include_files)
+    lines: List[str] = [
+        f"# HELP {METRIC_NAME} Latency of recommend pipeline stages.",
+        f"# TYPE {METRIC_NAME} histogram",
+    ]
+    for name in sorted(merged):
+        b = merged[name]
+        cum = 0
+        for le, c in zip([*BUCKETS, "+Inf"], b["counts"]):
+            cum += c
+            lines.append(f'{METRIC_NAME}_bucket{{stage="{name}",le="{le}"}} {cum}')
+        lines.append(f'{METRIC_NAME}_sum{{stage="{name}"}} {b["sum"]:.6f}')
+        lines.append(f'{METRIC_NAME}_count{{stage="{name}"}} {b["count"]}')
+    lines += [
+        f"# HELP {METRIC_NAME}_quantile Latency quantiles estimated from the histogram buckets.",
+        f"# TYPE {METRIC_NAME}_quantile gauge",
+    ]
+    for name in sorted(merged):
+        for q in QUANTILES:
+            val = _bucket_quantile(merged[name]["counts"], q)
+            lines.append(f'{METRIC_NAME}_quantile{{stage="{name}",quantile="{q}"}} {val:.6f}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,136 @@
+# app/prefs_store.py
+"""
+Per-user like/dislike store (SQLite, WAL) behind an in-process cache.
+
+- One row per (user_id, title): a click is a single-row upsert, so concurrent sessions
+  never lose each other's updates and a title is never liked and disliked at once
+- Reads come from a per-user cache of casefolded title sets (O(1) membership);
+  `PRAGMA data_version` tells us when another process wrote, and only then is the cache dropped
+- The legacy global data/user_prefs.json is imported once, under DEFAULT_USER
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Dict, FrozenSet, List, NamedTuple, Optional
+
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+PREFS_DB_PATH = os.getenv("PREFS_DB_PATH", "./data/user_prefs.sqlite")
+LEGACY_PREFS_JSON = os.getenv("PREFS_JSON_PATH", "./data/user_prefs.json")
+DEFAULT_USER = os.getenv("DEFAULT_USER", "default").strip() or "default"  # also the UI default
+
+class Prefs(NamedTuple):
+    liked: FrozenSet[str]     # casefolded titles
+    disliked: FrozenSet[str]
+    stamp: float              # last update time for this user (0.0 = no feedback yet)
+
+class PrefsStore:
+    """Thread-safe; one connection shared by all sessions of this process."""
+
+    def __init__(self, path: str | Path = PREFS_DB_PATH, legacy_json: str | Path | None = LEGACY_PREFS_JSON):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS prefs ("
+            " user_id TEXT NOT NULL, title_key TEXT NOT NULL, title TEXT NOT NULL,"
+            " liked INTEGER NOT NULL, updated REAL NOT NULL, PRIMARY KEY (user_id, title_key))"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.commit()
+        self._cache: Dict[str, Prefs] = {}
+        self._data_version = self._version()
+        if legacy_json:
+            self._migrate_json(Path(legacy_json))
+
+    def _version(self) -> int:
+        return self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    def _migrate_json(self, path: Path) -> None:
+        with self._lock:
+            done = self._db.execute("SELECT 1 FROM meta WHERE key='legacy_json_imported'").fetchone()
+            if done or not path.exists():
+                return
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                data = {}
+            now = time.time()
+            rows = [(DEFAULT_USER, str(t).strip().casefold(), str(t).strip(), flag, now)
+                    for key, flag in (("disliked", 0), ("liked", 1))
+                    for t in data.get(key) or [] if str(t).strip()]
+            self._db.executemany("INSERT OR REPLACE INTO prefs VALUES (?,?,?,?,?)", rows)
+            self._db.execute("INSERT INTO meta VALUES ('legacy_json_imported', ?)", (str(path),))
+            self._db.commit()
+
+    def get(self, user_id: str = DEFAULT_USER) -> Prefs:
+        with self._lock:
+            version = self._version()
+            if version != self._data_version:  # another process committed -> drop everything
+                self._cache.clear()
+                self._data_version = version
+            prefs = self._cache.get(user_id)
+            if prefs is None:
+                rows = self._db.execute(
+                    "SELECT title_key, liked, updated FROM prefs WHERE user_id=?", (user_id,)
+                ).fetchall()
+                prefs = Prefs(frozenset(t for t, lk, _ in rows if lk),
+                              frozenset(t for t, lk, _ in rows if not lk),
+                              max((u for _, _, u in rows), default=0.0))
+                self._cache[user_id] = prefs
+            return prefs
+
+    def set_feedback(self, user_id: str, title: str, liked: bool) -> None:
+        tl = title.strip()
+        if not tl:
+            return
+        key, now = tl.casefold(), time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO prefs VALUES (?,?,?,?,?)",
+                             (user_id, key, tl, int(liked), now))
+            self._db.commit()  # own commits do not change data_version -> other users stay cached
+            old = self._cache.get(user_id)
+            if old is not None:
+                liked_set, disliked_set = set(old.liked), set(old.disliked)
+                (liked_set if liked else disliked_set).add(key)
+                (disliked_set if liked else liked_set).discard(key)
+                self._cache[user_id] = Prefs(frozenset(liked_set), frozenset(disliked_set), now)
+
+    def replace(self, user_id: str, liked: List[str], disliked: List[str]) -> None:
+        """Overwrite a user's lists in one transaction (save_prefs compatibility)."""
+        now = time.time()
+        rows = [(user_id, str(t).strip().casefold(), str(t).strip(), flag, now)
+                for titles, flag in ((disliked, 0), (liked, 1)) for t in titles if str(t).strip()]
+        with self._lock:
+            with self._db:
+                self._db.execute("DELETE FROM prefs WHERE user_id=?", (user_id,))
+                self._db.executemany("INSERT OR REPLACE INTO prefs VALUES (?,?,?,?,?)", rows)
+            self._cache.pop(user_id, None)
+
+    def export(self, user_id: str = DEFAULT_USER) -> Dict[str, List[str]]:
+        """{"liked": [...], "disliked": [...]} with the titles as the user clicked them."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT title, liked FROM prefs WHERE user_id=? ORDER BY updated", (user_id,)
+            ).fetchall()
+        return {"liked": [t for t, lk in rows if lk], "disliked": [t for t, lk in rows if not lk]}
+
+_store: Optional[PrefsStore] = None
+_store_lock = threading.Lock()
+
+def get_store() -> PrefsStore:
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PrefsStore()
+        return _store
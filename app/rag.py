@@ -1,10 +1,25 @@
 # app/rag.py
 from __future__ import annotations
 import os
-from typing import List, Dict, Any
+import re
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 from openai import OpenAI
-import chromadb
+
+try:
+    from .embed_cache import cached_embed
+    from .index_version import current_index_version
+    from .catalog import facet_key
+    from .metrics import span
+except ImportError:
+    from embed_cache import cached_embed
+    from index_version import current_index_version
+    from catalog import facet_key
+    from metrics import span
 
 load_dotenv(override=True)
 
@@ -14,28 +29,140 @@ EMBED_MODEL     = os.getenv(
     "OPENAI_MODEL_EMBED",
     os.getenv("OPENAI_MODEL_EMBEDDINGS", "text-embedding-3-small")
 )
+RAG_BACKEND     = os.getenv("RAG_BACKEND", "chroma").strip().lower()  # chroma | numpy
+NUMPY_INDEX_DIR = os.getenv("NUMPY_INDEX_DIR", "./vector_index")
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "1024"))   # 0 disables the cache
+RESULT_CACHE_TTL  = float(os.getenv("RESULT_CACHE_TTL", "900"))   # seconds
+RAG_TOP_K       = int(os.getenv("RAG_TOP_K", "5"))  # used when callers pass k=None
 
 _client = OpenAI()
-_chroma = chromadb.PersistentClient(path=CHROMA_DIR)
-_collection = _chroma.get_or_create_collection(name=COLLECTION_NAME)  # robust
+
+# ---------------------- Backends ----------------------
+# Both expose .query(query_embeddings=..., n_results=...) -> chroma-shaped result, and .count().
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def _get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                if RAG_BACKEND == "numpy":
+                    try:
+                        from .vector_index import NumpyIndex
+                    except ImportError:
+                        from vector_index import NumpyIndex
+                    _backend = NumpyIndex(NUMPY_INDEX_DIR)
+                elif RAG_BACKEND == "chroma":
+                    import chromadb
+                    _chroma = chromadb.PersistentClient(path=CHROMA_DIR)
+                    _backend = _chroma.get_or_create_collection(name=COLLECTION_NAME)  # robust
+                else:
+                    raise ValueError(f"Unknown RAG_BACKEND={RAG_BACKEND!r} (expected 'chroma' or 'numpy')")
+    return _backend
+
+def _query(vecs: List[List[float]], k: int, where: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    backend = _get_backend()
+    if RAG_BACKEND == "numpy":
+        return backend.query(query_embeddings=vecs, n_results=k, where=where)
+    kwargs: Dict[str, Any] = {"where": where} if where else {}
+    return backend.query(query_embeddings=vecs, n_results=k,
+                         include=["documents","metadatas","distances"], **kwargs)
+
+# ---------------------- Filters ----------------------
+# filters = {"genre": "Fantasy" | [...], "theme": ... , "author": "...", "year_min": 1990, "year_max": 2010}
+# genre/theme lists mean "any of"; different keys are AND-ed. Applied inside the vector search.
+
+def build_where(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Translate `filters` into a chroma `where` clause (None if no filter is set)."""
+    if not filters:
+        return None
+    clauses: List[Dict[str, Any]] = []
+    for kind in ("genre", "theme"):
+        vals = filters.get(kind) or filters.get(kind + "s")
+        if isinstance(vals, str):
+            vals = [vals]
+        keys = [facet_key(kind, v) for v in (vals or []) if str(v).strip()]
+        if len(keys) == 1:
+            clauses.append({keys[0]: True})
+        elif keys:
+            clauses.append({"$or": [{key: True} for key in keys]})
+    author = str(filters.get("author") or "").strip()
+    if author:
+        clauses.append({"author_key": author.casefold()})
+    if filters.get("year_min") is not None:
+        clauses.append({"year": {"$gte": int(filters["year_min"])}})
+    if filters.get("year_max") is not None:
+        clauses.append({"year": {"$lte": int(filters["year_max"])}})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+# ---------------------- Result cache ----------------------
+# (normalized query, k) -> (index version, stored_at, hits). LRU + TTL; entries from an
+# older index version (bumped by init_vector_store) are treated as misses.
+
+_CacheKey = Tuple[str, Optional[int], str]
+_results: "OrderedDict[_CacheKey, Tuple[str, float, List[Dict[str, Any]]]]" = OrderedDict()
+_results_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+def _norm_query(q: str) -> str:
+    return re.sub(r"\s+", " ", q).strip().casefold()
+
+def _cache_get(key: _CacheKey, version: str) -> Optional[List[Dict[str, Any]]]:
+    with _results_lock:
+        entry = _results.get(key)
+        if entry is not None and entry[0] == version and time.time() - entry[1] <= RESULT_CACHE_TTL:
+            _results.move_to_end(key)
+            _stats["hits"] += 1
+            return [dict(h) for h in entry[2]]
+        if entry is not None:
+            del _results[key]
+        _stats["misses"] += 1
+        return None
+
+def _cache_put(key: _CacheKey, version: str, hits: List[Dict[str, Any]]) -> None:
+    if RESULT_CACHE_SIZE <= 0:
+        return
+    with _results_lock:
+        _results[key] = (version, time.time(), [dict(h) for h in hits])
+        _results.move_to_end(key)
+        while len(_results) > RESULT_CACHE_SIZE:
+            _results.popitem(last=False)
+
+def result_cache_stats() -> Dict[str, Any]:
+    with _results_lock:
+        total = _stats["hits"] + _stats["misses"]
+        return {"size": len(_results), "hits": _stats["hits"], "misses": _stats["misses"],
+                "hit_rate": round(_stats["hits"] / total, 4) if total else 0.0,
+                "version": current_index_version()}
+
+def clear_result_cache() -> None:
+    with _results_lock:
+        _results.clear()
+
+# ---------------------- Public API ----------------------
 
 def embed(text: str) -> List[float]:
-    resp = _client.embeddings.create(model=EMBED_MODEL, input=[text])
-    return resp.data[0].embedding
+    return cached_embed(_client, EMBED_MODEL, [text])[0]
+
+def embed_many(texts: List[str]) -> List[List[float]]:
+    """One embeddings request for all (uncached, de-duplicated) texts."""
+    return cached_embed(_client, EMBED_MODEL, texts)
 
-def search_books(query: str, k: int = 5) -> List[Dict[str, Any]]:
-    vec = embed(query)
-    res = _collection.query(query_embeddings=[vec], n_results=k,
-                            include=["documents","metadatas","distances"])
+def _hits(res: Dict[str, Any], qi: int) -> List[Dict[str, Any]]:
+    """Format the qi-th query's results from a chroma-shaped response."""
     out: List[Dict[str, Any]] = []
-    if res and res.get("ids"):
-        for i in range(len(res["ids"][0])):
-            meta = res["metadatas"][0][i] or {}
-            doc  = (res["documents"][0][i] or "").strip()
-            dist = float(res["distances"][0][i])
+    if res and res.get("ids") and qi < len(res["ids"]):
+        for i in range(len(res["ids"][qi])):
+            meta = res["metadatas"][qi][i] or {}
+            doc  = (res["documents"][qi][i] or "").strip()
+            dist = float(res["distances"][qi][i])
             score = 1.0 / (1.0 + dist)
             out.append({
-                "id": res["ids"][0][i],
+                "id": res["ids"][qi][i],
                 "title": meta.get("title") or "Unknown",
                 "author": meta.get("author") or "",
                 "year": meta.get("year"),
@@ -47,5 +174,44 @@ def search_books(query: str, k: int = 5) -> List[Dict[str, Any]]:
     out.sort(key=lambda x: x["score"], reverse=True)
     return out
 
+def search_books_many(queries: List[str], k: Optional[int] = 5,
+                      filters: Optional[Dict[str, Any]] = None) -> List[List[Dict[str, Any]]]:
+    """
+    Batched search: one embeddings call for all queries + one multi-vector query.
+    Returns one result list per query (same order, same dict shape as search_books).
+    Repeat queries are served from the result cache without any network call.
+    `filters` (see build_where) restrict the candidates before the vector scan.
+    k=None means RAG_TOP_K.
+    """
+    if not queries:
+        return []
+    k = RAG_TOP_K if k is None else int(k)
+    with span("rag.search_books"):
+        version = current_index_version()
+        where = build_where(filters)
+        wkey = json.dumps(where, sort_keys=True) if where else ""
+        keys = [(_norm_query(q), k, wkey) for q in queries]
+        out: List[Optional[List[Dict[str, Any]]]] = [
+            _cache_get(key, version) if RESULT_CACHE_SIZE > 0 else None for key in keys
+        ]
+        todo = [qi for qi, hits in enumerate(out) if hits is None]
+        if todo:
+            with span("rag.embed"):
+                vecs = embed_many([queries[qi] for qi in todo])
+            with span("rag.query"):
+                res = _query(vecs, k, where)
+            for j, qi in enumerate(todo):
+                out[qi] = _hits(res, j)
+                _cache_put(keys[qi], version, out[qi])
+    return out  # type: ignore[return-value]
+
+def search_books(query: str, k: Optional[int] = 5, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    return search_books_many([query], k=k, filters=filters)[0]
+
 def debug_collection_info() -> Dict[str, Any]:
-    return {"CHROMA_DIR": CHROMA_DIR, "COLLECTION": COLLECTION_NAME, "COUNT": _collection.count()}
+    info: Dict[str, Any] = {"BACKEND": RAG_BACKEND, "COUNT": _get_backend().count()}
+    if RAG_BACKEND == "numpy":
+        info["NUMPY_INDEX_DIR"] = NUMPY_INDEX_DIR
+    else:
+        info.update({"CHROMA_DIR": CHROMA_DIR, "COLLECTION": COLLECTION_NAME})
+    return info
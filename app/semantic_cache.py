@@ -0,0 +1,121 @@
+# app/semantic_cache.py
+"""
+Semantic answer cache: reuse a previous recommendation for a near-duplicate query.
+
+- Entries: (unit query embedding, scope, index version, stored_at, payload)
+- Lookup: one matrix-vector product over an in-memory float32 matrix; the best neighbour with
+  cosine >= SEMANTIC_CACHE_THRESHOLD, the same scope (k / filters / mode) and the current
+  index version wins
+- Fixed capacity (SEMANTIC_CACHE_SIZE); when full, the least recently used slot is overwritten
+- Entries older than SEMANTIC_CACHE_TTL or from another index version are ignored
+
+Process-local on purpose: it is small and rebuilt quickly from traffic.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+load_dotenv(override=True)
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "false").lower() in {"1", "true", "yes", "y"}
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # cosine
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2048"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))             # seconds
+
+_SAME_QUERY = 0.999  # a put this close to an entry of the same scope replaces it
+
+Entry = Tuple[str, str, float, Dict[str, Any]]  # (scope, index version, stored_at, payload)
+
+class SemanticCache:
+    """Thread-safe fixed-size vector table with LRU slot reuse."""
+
+    def __init__(self, capacity: int = SEMANTIC_CACHE_SIZE, threshold: float = SEMANTIC_CACHE_THRESHOLD,
+                 ttl: float = SEMANTIC_CACHE_TTL):
+        self.capacity = max(1, capacity)
+        self.threshold = threshold
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._mat: Optional[np.ndarray] = None          # [capacity, dim], allocated on first put
+        self._used = np.zeros(self.capacity)            # last-used time per slot; 0 = empty
+        self._entries: List[Optional[Entry]] = [None] * self.capacity
+        self._stats = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def _unit(vec: Sequence[float]) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def _valid(self, slot: int, scope: str, version: str, now: float) -> bool:
+        e = self._entries[slot]
+        return e is not None and e[0] == scope and e[1] == version and now - e[2] <= self.ttl
+
+    def _sims(self, q: np.ndarray) -> np.ndarray:
+        sims = self._mat @ q
+        sims[self._used == 0] = -np.inf
+        return sims
+
+    def get(self, vec: Sequence[float], scope: str, version: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """-> (cosine, payload) of the best valid neighbour above the threshold, else None."""
+        q = self._unit(vec)
+        now = time.time()
+        with self._lock:
+            if self._mat is not None and self._mat.shape[1] == q.shape[0]:
+                sims = self._sims(q)
+                for slot in np.argsort(-sims):
+                    if sims[slot] < self.threshold:
+                        break
+                    if self._valid(int(slot), scope, version, now):
+                        self._used[slot] = now
+                        self._stats["hits"] += 1
+                        return float(sims[slot]), dict(self._entries[int(slot)][3])
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, vec: Sequence[float], scope: str, version: str, payload: Dict[str, Any]) -> None:
+        q = self._unit(vec)
+        now = time.time()
+        with self._lock:
+            if self._mat is None or self._mat.shape[1] != q.shape[0]:  # first put / embedding model changed
+                self._mat = np.zeros((self.capacity, q.shape[0]), dtype=np.float32)
+                self._used[:] = 0
+                self._entries = [None] * self.capacity
+            sims = self._sims(q)
+            same = [int(s) for s in np.flatnonzero(sims >= _SAME_QUERY)
+                    if self._entries[int(s)] is not None and self._entries[int(s)][0] == scope]
+            slot = same[0] if same else int(np.argmin(self._used))
+            self._mat[slot] = q
+            self._used[slot] = now
+            self._entries[slot] = (scope, version, now, dict(payload))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._used[:] = 0
+            self._entries = [None] * self.capacity
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return {"size": int(np.count_nonzero(self._used)), "capacity": self.capacity,
+                    "threshold": self.threshold, "hits": self._stats["hits"], "misses": self._stats["misses"],
+                    "hit_rate": round(self._stats["hits"] / total, 4) if total else 0.0}
+
+_cache: SemanticCache | None = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> SemanticCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = SemanticCache()
+        return _cache
+
+def semantic_cache_stats() -> Dict[str, Any]:
+    if not SEMANTIC_CACHE_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_cache().stats()}
@@ -1,33 +1,511 @@
+import io
 import os
+import uuid
+import wave
+import queue
+import hashlib
+import threading
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import numpy as np
 from dotenv import load_dotenv
+
+try:
+    from .metrics import timed
+except ImportError:
+    from metrics import timed
+
 load_dotenv(override=True)
 
+STT_MODEL = os.getenv("STT_MODEL", "base")               # tiny, base, small, medium, large
+STT_DEVICE = os.getenv("STT_DEVICE", "auto").strip().lower()  # auto | cpu | cuda
+STT_THREADS = int(os.getenv("STT_THREADS", "0"))          # torch intra-op threads; 0 = torch default
+STT_QUANTIZE = os.getenv("STT_QUANTIZE", "none").strip().lower()  # none | int8 (dynamic, CPU only)
+STT_WARMUP = os.getenv("STT_WARMUP", "false").lower() in {"1", "true", "yes", "y"}
+STT_LANGUAGE = os.getenv("STT_LANGUAGE", "").strip() or None  # e.g. "ro"; None = detect per chunk
+
+# Long-audio mode (transcribe_long): silence-aligned chunks decoded in a process pool
+STT_LONG_SECONDS = float(os.getenv("STT_LONG_SECONDS", "90"))     # shorter audio: one in-process call
+STT_WORKERS = int(os.getenv("STT_WORKERS", "0"))                  # 0 = auto (cores // 2, max 8)
+STT_CHUNK_SECONDS = float(os.getenv("STT_CHUNK_SECONDS", "30"))   # Whisper's window: longer chunks get cut
+STT_MIN_CHUNK_SECONDS = float(os.getenv("STT_MIN_CHUNK_SECONDS", "10"))
+STT_MIN_SILENCE_MS = int(os.getenv("STT_MIN_SILENCE_MS", "300"))
+STT_VAD_MARGIN_DB = float(os.getenv("STT_VAD_MARGIN_DB", "10"))   # silence = below noise floor + margin
+STT_CACHE_SIZE = int(os.getenv("STT_CACHE_SIZE", "256"))          # transcripts by content hash; 0 disables
+
+TTS_SUBDIR = "tts"                                                 # <out_dir>/tts/<sha256>.wav
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+TTS_TIMEOUT = float(os.getenv("TTS_TIMEOUT", "60"))               # seconds a request waits for its job
+
+SAMPLE_RATE = 16000
+VAD_FRAME_MS = 30
+VAD_SILENCE_DBFS = -60.0
+
 # ----- TTS (pyttsx3: fully offline) -----
-def tts_say(text: str, out_dir: str | Path, filename: str = "recommendation.wav") -> Optional[str]:
-    """Speak `text` to a WAV file and return its path, or None on failure."""
+# One worker thread owns one long-lived engine (pyttsx3 engines are bound to the thread that
+# created them) and renders jobs from a queue. Output is content-addressed: the same text maps
+# to the same <sha256>.wav, so a repeated answer is never synthesized twice; each job renders
+# to a unique temp name and is renamed into place, so concurrent sessions never share a file.
+class _TTSWorker:
+    def __init__(self):
+        self._q: "queue.Queue[Tuple[str, Path, Future]]" = queue.Queue()
+        self._pending: Dict[Path, Future] = {}  # in-flight jobs, so identical requests share one
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+        threading.Thread(target=self._run, name="tts-worker", daemon=True).start()
+
+    def submit(self, text: str, out_path: Path) -> Future:
+        with self._lock:
+            fut = self._pending.get(out_path)
+            if fut is None:
+                fut = self._pending[out_path] = Future()
+                self._q.put((text, out_path, fut))
+            return fut
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[key] += n
+
+    def _run(self) -> None:
+        engine = None
+        while True:
+            text, out_path, fut = self._q.get()
+            tmp = out_path.with_name(f"{out_path.stem}.{uuid.uuid4().hex}.tmp.wav")
+            try:
+                if engine is None:
+                    import pyttsx3
+                    engine = pyttsx3.init()
+                engine.save_to_file(text, str(tmp))
+                engine.runAndWait()
+                os.replace(tmp, out_path)
+                self.count("evicted", _evict_tts(out_path.parent, keep=out_path))
+                fut.set_result(str(out_path))
+            except Exception as e:
+                engine = None  # start over with a fresh engine on the next job
+                tmp.unlink(missing_ok=True)
+                fut.set_exception(e)
+            finally:
+                with self._lock:
+                    self._pending.pop(out_path, None)
+
+_tts_worker: Optional[_TTSWorker] = None
+_tts_worker_lock = threading.Lock()
+
+def _get_tts_worker() -> _TTSWorker:
+    global _tts_worker
+    with _tts_worker_lock:
+        if _tts_worker is None:
+            _tts_worker = _TTSWorker()
+        return _tts_worker
+
+def _evict_tts(cache_dir: Path, keep: Optional[Path] = None) -> int:
+    """Delete the least recently used WAVs until the directory is under TTS_CACHE_MAX_BYTES."""
+    files = []
+    for p in cache_dir.glob("*.wav"):
+        if p.name.endswith(".tmp.wav") or p == keep:
+            continue
+        try:
+            st = p.stat()
+        except FileNotFoundError:
+            continue
+        files.append((st.st_mtime, st.st_size, p))
+    total = sum(f[1] for f in files) + (keep.stat().st_size if keep and keep.exists() else 0)
+    evicted = 0
+    for _, size, p in sorted(files):
+        if total <= TTS_CACHE_MAX_BYTES:
+            break
+        p.unlink(missing_ok=True)
+        total -= size
+        evicted += 1
+    return evicted
+
+def tts_cache_path(text: str, out_dir: str | Path) -> Path:
+    return Path(out_dir) / TTS_SUBDIR / f"{hashlib.sha256(text.encode('utf-8')).hexdigest()}.wav"
+
+@timed("speech.tts_say")
+def tts_say(text: str, out_dir: str | Path) -> Optional[str]:
+    """Speak `text` to a WAV file under out_dir/tts/ and return its path, or None on failure."""
     try:
-        import pyttsx3
-        out_dir = Path(out_dir)
-        out_dir.mkdir(parents=True, exist_ok=True)
-        out_path = out_dir / filename
-        engine = pyttsx3.init()
-        engine.save_to_file(text, str(out_path))
-        engine.runAndWait()
-        return str(out_path)
+        out_path = tts_cache_path(text, out_dir)
+        worker = _get_tts_worker()
+        if out_path.exists():
+            os.utime(out_path)  # recently used: last in line for eviction
+            worker.count("hits")
+            return str(out_path)
+        worker.count("misses")
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        return worker.submit(text, out_path).result(timeout=TTS_TIMEOUT)
     except Exception:
         return None
 
+def tts_cache_stats() -> Dict[str, Any]:
+    worker = _get_tts_worker()
+    with worker._lock:
+        stats = dict(worker.stats)
+    total = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+    return stats
+
 # ----- STT (openai-whisper: needs torch) -----
+# Loaded models live for the whole process, keyed by (name, device, quantize). Decoding on a
+# shared model installs per-call kv-cache hooks, so each model also carries its own lock.
+_models: Dict[Tuple[str, str, str], Tuple[Any, threading.Lock]] = {}
+_models_lock = threading.Lock()
+
+def _resolve_device(device: Optional[str] = None) -> str:
+    device = (device or STT_DEVICE).lower()
+    if device != "auto":
+        return device
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def _load_model(name: str, device: str) -> Any:
+    import torch
+    import whisper
+    if device == "cpu" and STT_THREADS > 0:
+        torch.set_num_threads(STT_THREADS)
+    model = whisper.load_model(name, device=device)
+    if device == "cpu" and STT_QUANTIZE == "int8":
+        model = _quantize_int8(model)
+    return model.eval()
+
+def _quantize_int8(model: Any) -> Any:
+    """
+    int8 weights for the Linear layers (most of the decoder cost); activations stay fp32.
+    Whisper's layers are whisper.model.Linear, a subclass that quantize_dynamic skips (it matches
+    exact types), so they are first swapped for plain nn.Linear sharing the same parameters,
+    which computes the same thing in fp32 on CPU.
+    """
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as QuantizedLinear
+    for parent in list(model.modules()):
+        for child_name, child in list(parent.named_children()):
+            if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+                plain = torch.nn.Linear(child.in_features, child.out_features,
+                                        bias=child.bias is not None, device="meta")
+                plain.weight, plain.bias = child.weight, child.bias
+                setattr(parent, child_name, plain)
+    model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    swapped = sum(isinstance(m, QuantizedLinear) for m in model.modules())
+    if not swapped:
+        raise RuntimeError("STT_QUANTIZE=int8: no Linear layer was quantized")
+    return model
+
+def get_whisper_model(name: Optional[str] = None, device: Optional[str] = None) -> Tuple[Any, threading.Lock]:
+    """Process-wide (model, lock); the first call per (name, device) loads the weights."""
+    key = (name or STT_MODEL, _resolve_device(device), STT_QUANTIZE)
+    with _models_lock:  # held while loading: concurrent first calls wait instead of loading twice
+        entry = _models.get(key)
+        if entry is None:
+            entry = _models[key] = (_load_model(key[0], key[1]), threading.Lock())
+        return entry
+
+def _decode_options(device: str) -> Dict[str, Any]:
+    opts: Dict[str, Any] = {"fp16": device == "cuda"}  # fp16 on CPU only warns and falls back to fp32
+    if STT_LANGUAGE:
+        opts["language"] = STT_LANGUAGE
+    return opts
+
+def _transcribe(audio: Any, device: Optional[str] = None) -> str:
+    """Decode a path or a 16 kHz mono float32 array with the shared model for `device`."""
+    device = _resolve_device(device)
+    model, lock = get_whisper_model(device=device)
+    with lock:
+        result = model.transcribe(audio if isinstance(audio, np.ndarray) else str(audio),
+                                  **_decode_options(device))
+    return result.get("text", "").strip()
+
+def warmup_stt(name: Optional[str] = None, device: Optional[str] = None) -> None:
+    """Load the model and run one short decode so the first real request pays decode time only."""
+    device = _resolve_device(device)
+    model, lock = get_whisper_model(name, device)
+    with lock:
+        model.transcribe(np.zeros(16000, dtype=np.float32), **_decode_options(device))
+
+_warmup_thread: Optional[threading.Thread] = None
+
+def warmup_stt_async() -> Optional[threading.Thread]:
+    """
+    warmup_stt() in a daemon thread if STT_WARMUP is set (app start-up); errors are ignored.
+    Idempotent, so it can sit at the top of a Streamlit script that reruns on every interaction.
+    """
+    global _warmup_thread
+    if not STT_WARMUP or _warmup_thread is not None:
+        return _warmup_thread
+
+    def _run():
+        try:
+            warmup_stt()
+        except Exception:
+            pass
+
+    _warmup_thread = threading.Thread(target=_run, name="stt-warmup", daemon=True)
+    _warmup_thread.start()
+    return _warmup_thread
+
+@timed("speech.transcribe_audio")
 def transcribe_audio(input_path: str | Path) -> str:
     """
     Transcribe audio to text using openai-whisper (CPU).
     Accepts WAV/MP3; for MP3 needs ffmpeg installed.
     """
+    return _transcribe(input_path)
+
+# ----- STT: long audio (energy VAD + process pool) -----
+def split_on_silence(audio: np.ndarray, sr: int = SAMPLE_RATE) -> List[Tuple[int, int]]:
+    """
+    [(start, end)] sample ranges of at most STT_CHUNK_SECONDS, cut in the middle of the latest
+    pause (>= STT_MIN_SILENCE_MS of low-energy 30 ms frames) that still
+    leaves STT_MIN_CHUNK_SECONDS; with no pause in range, at the quietest frame near the limit.
+    Chunks that are silence only are dropped (Whisper tends to hallucinate text on them).
+    """
+    frame = sr * VAD_FRAME_MS // 1000
+    n = len(audio) // frame
+    if n == 0:
+        return [(0, len(audio))] if len(audio) else []
+    frames = audio[:n * frame].reshape(n, frame).astype(np.float64)
+    energy = 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    # noise floor + margin, but never within 20 dB of the speech level (audio that is mostly
+    # speech has its 10th percentile inside speech); near-digital silence always counts
+    threshold = min(np.percentile(energy, 10) + STT_VAD_MARGIN_DB, np.percentile(energy, 95) - 20)
+    silent = (energy < threshold) | (energy < VAD_SILENCE_DBFS)
+
+    # midpoints of silent runs long enough to count as a pause
+    min_run = max(1, STT_MIN_SILENCE_MS // VAD_FRAME_MS)
+    edges = np.diff(np.concatenate(([0], silent.astype(np.int8), [0])))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    pauses = [(a + b) // 2 for a, b in zip(starts, ends) if b - a >= min_run]
+
+    max_f = max(1, int(STT_CHUNK_SECONDS * 1000) // VAD_FRAME_MS)
+    min_f = min(max_f, int(STT_MIN_CHUNK_SECONDS * 1000) // VAD_FRAME_MS)
+    cuts, pos = [0], 0
+    while n - pos > max_f:
+        lo, hi = pos + min_f, pos + max_f
+        inside = [p for p in pauses if lo < p <= hi]
+        if inside:
+            pos = int(inside[-1])
+        else:  # no pause: quietest frame in the last quarter of the window, keeps chunks long
+            lo = max(lo, hi - max_f // 4)
+            pos = lo + 1 + int(np.argmin(energy[lo + 1:hi + 1]))
+        cuts.append(pos)
+    cuts.append(n)
+
+    out = []
+    for a, b in zip(cuts, cuts[1:]):
+        if not silent[a:b].all():
+            out.append((int(a * frame), len(audio) if b == n else int(b * frame)))
+    return out
+
+def _load_audio(source: Any) -> np.ndarray:
+    if isinstance(source, np.ndarray):
+        return source.astype(np.float32, copy=False)
     import whisper
-    model_name = os.getenv("STT_MODEL", "base")  # tiny, base, small, medium, large
-    model = whisper.load_model(model_name)
-    result = model.transcribe(str(input_path))
-    return result.get("text", "").strip()
+    return whisper.load_audio(str(source))  # ffmpeg -> 16 kHz mono float32
+
+def _stt_workers() -> int:
+    return STT_WORKERS if STT_WORKERS > 0 else max(1, min(8, (os.cpu_count() or 1) // 2))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _pool_init(threads: int) -> None:
+    """Worker start-up: split the cores between workers, then load the model once."""
+    global STT_THREADS
+    STT_THREADS = threads
+    get_whisper_model(device="cpu")
+
+def _pool_transcribe(audio: np.ndarray) -> str:
+    return _transcribe(audio, "cpu")
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = _stt_workers()
+            threads = max(1, (os.cpu_count() or 1) // workers)
+            # spawn: forking a process that already runs torch / Streamlit threads is unsafe
+            _pool = ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"),
+                                        initializer=_pool_init, initargs=(threads,))
+        return _pool
+
+def _reset_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def transcribe_long_iter(source: Any) -> Iterator[Tuple[int, int, str]]:
+    """
+    Long-audio transcription with partial results: yields (chunks_done, chunks_total, text) each
+    time a chunk finishes, `text` being the finished chunks stitched in audio order. Chunks go to
+    a process pool (STT_WORKERS, one model per worker, loaded once); on GPU, or when there is a
+    single chunk, they are decoded in-process instead. Audio up to STT_LONG_SECONDS is not split.
+    """
+    audio = _load_audio(source)
+    if len(audio) <= STT_LONG_SECONDS * SAMPLE_RATE:
+        yield 1, 1, _transcribe(audio)
+        return
+    spans = split_on_silence(audio)
+    texts: List[str] = [""] * len(spans)
+
+    def _stitched() -> str:
+        return " ".join(t for t in texts if t)
+
+    if not spans:
+        yield 0, 0, ""
+        return
+    if len(spans) == 1 or _stt_workers() == 1 or _resolve_device() != "cpu":
+        for i, (a, b) in enumerate(spans):
+            texts[i] = _transcribe(audio[a:b])
+            yield i + 1, len(spans), _stitched()
+        return
+
+    pool = _get_pool()
+    try:
+        futures = {pool.submit(_pool_transcribe, audio[a:b]): i for i, (a, b) in enumerate(spans)}
+        for done, fut in enumerate(as_completed(futures), start=1):
+            texts[futures[fut]] = fut.result()
+            yield done, len(spans), _stitched()
+    except BrokenProcessPool:
+        _reset_pool()  # a worker died (e.g. OOM); the next call starts a fresh pool
+        raise
+
+@timed("speech.transcribe_long")
+def transcribe_long(source: Any) -> str:
+    """transcribe_long_iter() without the partials: the final stitched transcript."""
+    text = ""
+    for _, _, text in transcribe_long_iter(source):
+        pass
+    return text
+
+# ----- STT: in-memory uploads (no temp files) + transcript cache -----
+def _resample(x: np.ndarray, sr: int, target: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Band-limited (FFT) resampling in 10 s blocks, each with 1 s of context on both sides so
+    block edges don't click. The signal is mirrored by 1 s at both ends first (plus up to a
+    second more at the end), so the first and last blocks get the same context as the others
+    and every block spans whole seconds, i.e. maps onto an exact number of output samples.
+    """
+    if sr == target:
+        return x.astype(np.float32, copy=False)
+    n = len(x)
+    if n == 0:
+        return np.zeros(0, np.float32)
+    block, pad = 10 * sr, sr
+    # odd reflection continues the slope too, so the mirror adds no kink to ring at the edges;
+    # the padding then fades to 0 so the FFT's wrap-around (end -> start) is continuous as well
+    right = pad + (-n) % sr
+    xp = np.pad(x.astype(np.float64), (pad, right), mode="reflect" if n > 1 else "edge",
+                reflect_type="odd")
+    xp[:pad] *= 0.5 - 0.5 * np.cos(np.pi * np.arange(pad) / pad)
+    xp[n + pad:] *= 0.5 + 0.5 * np.cos(np.pi * np.arange(1, right + 1) / right)
+    out = []
+    for start in range(0, n, block):
+        seg = xp[start:start + block + 2 * pad]  # [start - pad, start + block + pad) in x
+        m = int(round(len(seg) * target / sr))
+        y = np.fft.irfft(np.fft.rfft(seg), m) * (m / len(seg))
+        keep = int(round((min(n, start + block) - start) * target / sr))
+        out.append(y[target:target + keep])  # skip the 1 s of leading context
+    return np.concatenate(out).astype(np.float32)
+
+def _decode_wav(data: bytes) -> np.ndarray:
+    """PCM WAV (8/16/24/32-bit, any rate/channels) -> 16 kHz mono float32; wave.Error if not PCM WAV."""
+    with wave.open(io.BytesIO(data)) as w:
+        ch, width, sr = w.getnchannels(), w.getsampwidth(), w.getframerate()
+        raw = w.readframes(w.getnframes())
+    if width == 1:
+        x = (np.frombuffer(raw, np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        x = np.frombuffer(raw, "<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        b = np.frombuffer(raw, np.uint8).reshape(-1, 3).astype(np.int32)
+        x = ((b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)) << 8 >> 8).astype(np.float32) / 8388608.0
+    elif width == 4:
+        x = np.frombuffer(raw, "<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise wave.Error(f"unsupported sample width: {width}")
+    if ch > 1:
+        x = x[:len(x) - len(x) % ch].reshape(-1, ch).mean(axis=1)
+    return _resample(x, sr)
+
+def _decode_ffmpeg(data: bytes) -> np.ndarray:
+    """Compressed formats: bytes -> ffmpeg (stdin/stdout pipes) -> 16 kHz mono float32."""
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-threads", "0", "-i", "pipe:0",
+           "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "pipe:1"]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout
+    except FileNotFoundError as e:
+        raise RuntimeError("ffmpeg not found: needed for non-WAV audio (see README prerequisites)") from e
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"Failed to decode audio: {e.stderr.decode(errors='replace').strip()}") from e
+    return np.frombuffer(out, np.int16).astype(np.float32) / 32768.0
+
+def decode_audio_bytes(data: bytes) -> np.ndarray:
+    """Uploaded bytes -> 16 kHz mono float32. PCM WAV is decoded in-process; anything else via ffmpeg."""
+    if data[:4] == b"RIFF" and data[8:12] == b"WAVE":
+        try:
+            return _decode_wav(data)
+        except (wave.Error, EOFError, ValueError):
+            pass  # e.g. float / ADPCM WAV: let ffmpeg handle it
+    return _decode_ffmpeg(data)
+
+_transcripts: "OrderedDict[str, str]" = OrderedDict()
+_transcripts_lock = threading.Lock()
+_stt_stats = {"hits": 0, "misses": 0}
+
+def _transcript_key(data: bytes) -> str:
+    # same bytes transcribed with another model / language may read differently
+    return f"{hashlib.sha256(data).hexdigest()}|{STT_MODEL}|{STT_LANGUAGE}|{STT_QUANTIZE}"
+
+def _transcript_get(key: str) -> Optional[str]:
+    with _transcripts_lock:
+        text = _transcripts.get(key)
+        if text is None:
+            _stt_stats["misses"] += 1
+            return None
+        _transcripts.move_to_end(key)
+        _stt_stats["hits"] += 1
+        return text
+
+def _transcript_put(key: str, text: str) -> None:
+    if STT_CACHE_SIZE <= 0:
+        return
+    with _transcripts_lock:
+        _transcripts[key] = text
+        _transcripts.move_to_end(key)
+        while len(_transcripts) > STT_CACHE_SIZE:
+            _transcripts.popitem(last=False)
+
+def stt_cache_stats() -> Dict[str, Any]:
+    with _transcripts_lock:
+        total = _stt_stats["hits"] + _stt_stats["misses"]
+        return {"size": len(_transcripts), "hits": _stt_stats["hits"], "misses": _stt_stats["misses"],
+                "hit_rate": round(_stt_stats["hits"] / total, 4) if total else 0.0}
+
+def transcribe_bytes_iter(data: bytes) -> Iterator[Tuple[int, int, str]]:
+    """transcribe_long_iter() for uploaded bytes, with no temp file; repeated bytes hit the cache."""
+    key = _transcript_key(data)
+    text = _transcript_get(key)
+    if text is not None:
+        yield 1, 1, text
+        return
+    done = total = 0
+    for done, total, text in transcribe_long_iter(decode_audio_bytes(data)):
+        yield done, total, text
+    if done == total:
+        _transcript_put(key, text or "")
+
+@timed("speech.transcribe_bytes")
+def transcribe_bytes(data: bytes) -> str:
+    """Transcript of an in-memory audio file (WAV/MP3/...); cached by content hash."""
+    text = ""
+    for _, _, text in transcribe_bytes_iter(data):
+        pass
+    return text
@@ -1,13 +1,25 @@
 # app/tools.py
 from __future__ import annotations
-import os, json, re, unicodedata
+import os, json, re, heapq, threading, unicodedata
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 
+try:
+    from .catalog import iter_entries, read_entry, sniff_format
+    from .metrics import timed
+except ImportError:
+    from catalog import iter_entries, read_entry, sniff_format
+    from metrics import timed
+
 load_dotenv(override=True)
 
 DATA_JSON = os.getenv("DATA_JSON", "./data/book_summaries.json")
+# Side-car title index (normalized title -> byte span in DATA_JSON); default: next to DATA_JSON
+TITLE_INDEX_PATH = os.getenv("TITLE_INDEX_PATH", "")
+FUZZY_MIN_SCORE = float(os.getenv("FUZZY_MIN_SCORE", "0.4"))  # trigram Dice score for a fallback hit
+FUZZY_MAX_POSTING = int(os.getenv("FUZZY_MAX_POSTING", "20000"))  # skip trigrams more common than this
+EXACT_MATCH_MIN_SCORE = float(os.getenv("EXACT_MATCH_MIN_SCORE", "0.85"))  # "near-exact" for match_catalog
 
 def _norm(s: str) -> str:
     """Lowercase, remove diacritics, collapse non-alnum → match titles robustly."""
@@ -16,12 +28,160 @@ def _norm(s: str) -> str:
     s = re.sub(r"[^a-z0-9]+", " ", s).strip()
     return s
 
+def _trigrams(nt: str) -> set[str]:
+    """Character trigrams of an already-normalized string (padded, pg_trgm style)."""
+    if not nt:
+        return set()
+    s = f"  {nt} "
+    return {s[i:i + 3] for i in range(len(s) - 2)}
+
+def _dice(a: set[str], b: set[str]) -> float:
+    return 2.0 * len(a & b) / (len(a) + len(b)) if a and b else 0.0
+
+def _contained(a: set[str], b: set[str]) -> float:
+    """1.0 when one trigram set holds the other (subtitle added, or a partial title), else 0."""
+    return 1.0 if a and b and (a <= b or b <= a) else 0.0
+
 def _load_data() -> Any:
+    """Only legacy dict catalogs are parsed whole; arrays/JSONL go through the title index."""
     p = Path(DATA_JSON)
     if not p.exists():
         raise FileNotFoundError(f"DATA_JSON not found at {p}")
     return json.loads(p.read_text(encoding="utf-8"))
 
+# ---------------------- Title index ----------------------
+# Built once per DATA_JSON version (mtime + size), persisted as JSON next to the catalog and
+# kept in memory; a lookup is a dict probe plus one seek+read of the matching record.
+
+_INDEX_VERSION = 1
+
+class _TitleIndex:
+    def __init__(self, stamp: List[int], entries: List[List[Any]], titles: Dict[str, int]):
+        self.stamp = stamp        # [mtime_ns, size] of DATA_JSON when built
+        self.entries = entries    # [[offset, length, title, author], ...] in file order
+        self.titles = titles      # normalized title -> entry position (first occurrence)
+
+        self._grams: Optional[Dict[str, List[int]]] = None  # trigram -> entry positions (lazy)
+        self._authors: Optional[Dict[str, List[int]]] = None  # normalized author -> positions (lazy)
+        self._grams_lock = threading.Lock()
+
+    def read(self, i: int) -> Dict[str, Any]:
+        off, length = self.entries[i][0], self.entries[i][1]
+        return read_entry(DATA_JSON, off, length)
+
+    def _postings(self) -> Dict[str, List[int]]:
+        """Inverted trigram index over normalized titles + authors, built on first fuzzy lookup."""
+        if self._grams is None:
+            with self._grams_lock:
+                if self._grams is None:
+                    grams: Dict[str, List[int]] = {}
+                    for i, e in enumerate(self.entries):
+                        for g in _trigrams(_norm(e[2])) | _trigrams(_norm(e[3])):
+                            grams.setdefault(g, []).append(i)
+                    self._grams = grams
+        return self._grams
+
+    def authors(self) -> Dict[str, List[int]]:
+        if self._authors is None:
+            with self._grams_lock:
+                if self._authors is None:
+                    authors: Dict[str, List[int]] = {}
+                    for i, e in enumerate(self.entries):
+                        na = _norm(e[3])
+                        if na:
+                            authors.setdefault(na, []).append(i)
+                    self._authors = authors
+        return self._authors
+
+    def fuzzy(self, query: str, k: int = 5) -> List[Tuple[int, float]]:
+        """
+        Best-scoring entries for `query` as [(position, score)], score = trigram Dice
+        against the title (or title + author, whichever is higher), or 1.0 when the query
+        contains the whole title or the title contains the whole query.
+        Only entries sharing a trigram with the query are scored, and very common
+        trigrams (longer postings than FUZZY_MAX_POSTING) are skipped when rarer ones exist.
+        """
+        q = _trigrams(_norm(query))
+        if not q:
+            return []
+        postings = self._postings()
+        lists = sorted((postings[g] for g in q if g in postings), key=len)
+        if not lists:
+            return []
+        rare = [pl for pl in lists if len(pl) <= FUZZY_MAX_POSTING] or lists[:1]
+
+        shared: Dict[int, int] = {}
+        for pl in rare:
+            for i in pl:
+                shared[i] = shared.get(i, 0) + 1
+        # Re-score only the strongest candidates exactly
+        pool = heapq.nlargest(max(k * 20, 50), shared, key=lambda i: (shared[i], -i))
+
+        scored: List[Tuple[int, float]] = []
+        for i in pool:
+            t = _trigrams(_norm(self.entries[i][2]))
+            a = _trigrams(_norm(self.entries[i][3]))
+            scored.append((i, max(_dice(q, t), _dice(q, t | a), _contained(q, t))))
+        scored.sort(key=lambda x: (-x[1], x[0]))
+        return scored[:k]
+
+_index: Optional[_TitleIndex] = None
+_index_lock = threading.Lock()
+
+def _index_path() -> Path:
+    return Path(TITLE_INDEX_PATH or f"{DATA_JSON}.idx.json")
+
+def _stamp(p: Path) -> List[int]:
+    st = p.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+def _build_index(p: Path, stamp: List[int]) -> _TitleIndex:
+    entries: List[List[Any]] = []
+    titles: Dict[str, int] = {}
+    for off, length, rec in iter_entries(p):
+        if not isinstance(rec, dict):
+            continue
+        title = str(rec.get("title") or "")
+        entries.append([off, length, title, str(rec.get("author") or "")])
+        titles.setdefault(_norm(title), len(entries) - 1)
+    idx = _TitleIndex(stamp, entries, titles)
+
+    out = _index_path()
+    try:
+        tmp = out.with_name(out.name + ".tmp")
+        tmp.write_text(json.dumps({"version": _INDEX_VERSION, "stamp": stamp,
+                                   "entries": entries, "titles": titles}, ensure_ascii=False),
+                       encoding="utf-8")
+        os.replace(tmp, out)
+    except OSError:
+        pass  # read-only data dir: keep the in-memory index only
+    return idx
+
+def _read_persisted(stamp: List[int]) -> Optional[_TitleIndex]:
+    try:
+        raw = json.loads(_index_path().read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if raw.get("version") != _INDEX_VERSION or raw.get("stamp") != stamp:
+        return None
+    return _TitleIndex(stamp, raw["entries"], raw["titles"])
+
+def _get_index() -> Optional[_TitleIndex]:
+    """Current title index, or None for legacy dict catalogs. Rebuilt when DATA_JSON changes."""
+    global _index
+    p = Path(DATA_JSON)
+    if not p.exists():
+        raise FileNotFoundError(f"DATA_JSON not found at {p}")
+    stamp = _stamp(p)
+    if _index is not None and _index.stamp == stamp:
+        return _index
+    with _index_lock:
+        if _index is None or _index.stamp != stamp:
+            if sniff_format(p) == "object":
+                return None
+            _index = _read_persisted(stamp) or _build_index(p, stamp)
+        return _index
+
 def _summary_from_dict(data: Dict[str, Any], title: str) -> Optional[str]:
     # exact
     if title in data:
@@ -34,38 +194,107 @@ def _summary_from_dict(data: Dict[str, Any], title: str) -> Optional[str]:
             return v if isinstance(v, str) else (v.get("summary") if isinstance(v, dict) else None)
     return None
 
-def _summary_from_list(data: List[Dict[str, Any]], title: str) -> Optional[str]:
+def _find_in_index(idx: _TitleIndex, title: str) -> Optional[int]:
     nt = _norm(title)
-    # exact normalized
-    for rec in data:
-        if _norm(str(rec.get("title", ""))) == nt:
-            return str(rec.get("summary") or "")
-    # fallback: contains
-    for rec in data:
-        t = _norm(str(rec.get("title", "")))
-        if nt in t or t in nt:
-            return str(rec.get("summary") or "")
+    # exact normalized: O(1) probe
+    i = idx.titles.get(nt)
+    if i is not None:
+        return i
+    # fallback: best fuzzy (trigram) match above FUZZY_MIN_SCORE
+    best = idx.fuzzy(title, k=1)
+    if best and best[0][1] >= FUZZY_MIN_SCORE:
+        return best[0][0]
     return None
 
+def _summary_from_list(idx: _TitleIndex, title: str) -> Optional[str]:
+    i = _find_in_index(idx, title)
+    if i is None:
+        return None
+    return str(idx.read(i).get("summary") or "")
+
+def fuzzy_title_lookup(title: str, k: int = 5) -> List[Dict[str, Any]]:
+    """
+    Ranked fuzzy matches for `title` (typos, partial titles, "title by author"):
+    [{"title", "author", "score"}], best first; empty for legacy dict catalogs.
+    """
+    if not title or not str(title).strip():
+        return []
+    idx = _get_index()
+    if idx is None:
+        return []
+    return [
+        {"title": idx.entries[i][2], "author": idx.entries[i][3], "score": round(score, 4)}
+        for i, score in idx.fuzzy(title, k=k)
+    ]
+
+def match_catalog(query: str) -> Optional[Dict[str, Any]]:
+    """
+    Deterministic router check: does `query` name a catalog title or author (exactly or nearly)?
+    Returns {"match": "title"|"author", "score", "record": {...full catalog record...},
+    "others": [other titles by the same author]} or None. No model calls, no full-file parse.
+    """
+    if not query or not str(query).strip():
+        return None
+    idx = _get_index()
+    if idx is None:
+        return None
+    nq = _norm(query)
+    if not nq:
+        return None
+
+    kind, pos, score = None, None, 0.0
+    if nq in idx.titles:
+        kind, pos, score = "title", idx.titles[nq], 1.0
+    elif nq in idx.authors():
+        kind, pos, score = "author", idx.authors()[nq][0], 1.0
+    else:
+        q = _trigrams(nq)
+        for i, _ in idx.fuzzy(query, k=5):
+            # near-exact means Dice here: a query merely containing a title is not a title query
+            t, a = _trigrams(_norm(idx.entries[i][2])), _trigrams(_norm(idx.entries[i][3]))
+            sc = max(_dice(q, t), _dice(q, t | a))
+            if sc >= EXACT_MATCH_MIN_SCORE and sc > score:
+                kind, pos, score = "title", i, sc
+            sa = _dice(q, a)
+            if sa >= EXACT_MATCH_MIN_SCORE and sa > score:
+                kind, pos, score = "author", i, sa
+    if pos is None:
+        return None
+
+    author_positions = idx.authors().get(_norm(idx.entries[pos][3]), [])
+    return {
+        "match": kind,
+        "score": round(score, 4),
+        "record": idx.read(pos),
+        "others": [idx.entries[i][2] for i in author_positions if i != pos][:5],
+    }
+
+@timed("tools.get_summary_by_title")
 def get_summary_by_title(title: str) -> str:
     """
     Returnează rezumatul complet pentru titlul exact (robust la diacritice/punctuație).
     Suportă:
       - dict: { "Title": "summary", ... }
       - list: [ { "title": "...", "summary": "...", "genres": [...], "themes": [...] }, ... ]
+      - JSONL: același obiect pe fiecare linie (fișier .jsonl / .ndjson)
     """
     if not title or not str(title).strip():
         return "Titlu invalid."
-    data = _load_data()
     summary: Optional[str] = None
 
-    if isinstance(data, dict):
-        summary = _summary_from_dict(data, title)
-    elif isinstance(data, list):
-        summary = _summary_from_list(data, title)
-    else:
+    try:
+        idx = _get_index()
+    except ValueError:
         return "Formatul DATA_JSON nu este suportat (nu e dict sau list)."
 
+    if idx is not None:
+        summary = _summary_from_list(idx, title)
+    else:
+        data = _load_data()
+        if not isinstance(data, dict):
+            return "Formatul DATA_JSON nu este suportat (nu e dict sau list)."
+        summary = _summary_from_dict(data, title)
+
     if summary:
         return summary.strip()
 
@@ -3,27 +3,58 @@
 # ---- Safe imports for both "module" and "script" run modes ----
 # app/ui_streamlit.py
 try:
-    from .chatbot import recommend_with_tool, record_feedback
-    from .speech import transcribe_audio
-    from .rag import search_books, debug_collection_info
+    from .chatbot import recommend_with_tool, recommend_stream, record_feedback
+    from .speech import transcribe_bytes_iter, stt_cache_stats, tts_cache_stats, warmup_stt_async
+    from .rag import search_books, debug_collection_info, result_cache_stats
     from .tools import get_summary_by_title
+    from .metrics import snapshot as metrics_snapshot
+    from .llm_cache import llm_cache_stats
+    from .semantic_cache import semantic_cache_stats
+    from .prefs_store import DEFAULT_USER
+    from .budget import usage_totals
 except Exception:
-    from chatbot import recommend_with_tool, record_feedback
-    from speech import transcribe_audio
-    from rag import search_books, debug_collection_info
+    from chatbot import recommend_with_tool, recommend_stream, record_feedback
+    from speech import transcribe_bytes_iter, stt_cache_stats, tts_cache_stats, warmup_stt_async
+    from rag import search_books, debug_collection_info, result_cache_stats
     from tools import get_summary_by_title
+    from metrics import snapshot as metrics_snapshot
+    from llm_cache import llm_cache_stats
+    from semantic_cache import semantic_cache_stats
+    from prefs_store import DEFAULT_USER
+    from budget import usage_totals
 
 
 # (We keep these imports even if not used everywhere; do not remove functionality.)
 from streamlit_webrtc import webrtc_streamer, WebRtcMode, RTCConfiguration  # noqa: F401
 
 import os
-from pathlib import Path
+import uuid
 from dotenv import load_dotenv
 import streamlit as st
 import streamlit.components.v1 as components
 
 load_dotenv(override=True)
+warmup_stt_async()  # STT_WARMUP=true: load Whisper in the background once per process
+
+def _new_user_id():
+    """Opt-in anonymous id (button callback: runs before the text_input is drawn)."""
+    st.session_state["user_id"] = uuid.uuid4().hex[:8]
+
+def _prepend(first, rest):
+    """Re-attach the chunk pulled under the spinner to the rest of the stream."""
+    if first:
+        yield first
+    yield from rest
+
+def _transcribe_progress(data: bytes) -> str:
+    """Transcribe an upload, showing the stitched partial text while long audio is decoded in chunks."""
+    box = st.empty()
+    text = ""
+    for done, total, text in transcribe_bytes_iter(data):
+        if total > 1:
+            box.caption(f"Transcriere parțială ({done}/{total}): {text}")
+    box.empty()
+    return text
 
 # ---------------------- Page & Theme ----------------------
 st.set_page_config(page_title="Smart Librarian", page_icon="📚", layout="centered")
@@ -107,7 +138,52 @@ with st.sidebar:
     st.divider()
     tts = st.toggle("🔊 Text-to-Speech pentru răspunsul final", value=False)
     gen_img = st.toggle("🖼️ Generează copertă simbolică", value=False)
+    single_call = st.toggle("⚡ Un singur apel LLM (titlu + motive)", value=os.getenv("RECO_MODE", "two_step") == "single",
+                            help="Structured output: alegerea și motivele într-un singur apel; rezumatul vine local.")
+    reco_mode = "single" if single_call else "two_step"
     st.caption("**Hint:** TTS și imaginea cresc timpul de răspuns.")
+    st.divider()
+    # stable across reloads: ?user=<id> in the URL, else DEFAULT_USER (which owns the imported legacy prefs)
+    if "user_id" not in st.session_state:
+        st.session_state["user_id"] = st.query_params.get("user", DEFAULT_USER)
+    user_id = st.text_input("👤 ID utilizator", key="user_id",
+                            help="Preferințele (👍/👎) sunt salvate separat pentru fiecare utilizator.").strip() or DEFAULT_USER
+    st.button("🎲 ID nou", on_click=_new_user_id, help="Un ID anonim nou, cu preferințe separate.")
+    if user_id == DEFAULT_USER:
+        st.query_params.pop("user", None)
+    elif st.query_params.get("user") != user_id:
+        st.query_params["user"] = user_id  # keep it in the URL so a reload finds the same prefs
+    last_pick = st.session_state.get("last_pick")
+    if last_pick:
+        st.caption(f"Ți-a plăcut **{last_pick}**?")
+        f1, f2 = st.columns(2)
+        if f1.button("👍", key="fb_like", use_container_width=True):
+            record_feedback(last_pick, True, user_id=user_id)
+            st.toast("Notat: îți place.")
+        if f2.button("👎", key="fb_dislike", use_container_width=True):
+            record_feedback(last_pick, False, user_id=user_id)
+            st.toast("Notat: nu îți place.")
+    st.divider()
+    with st.expander("📊 Metrici (debug)"):
+        stages = metrics_snapshot()
+        if stages:
+            st.dataframe(
+                [{"etapă": name, "n": m["count"], "p50 ms": round(m["p50"] * 1000, 1),
+                  "p95 ms": round(m["p95"] * 1000, 1), "p99 ms": round(m["p99"] * 1000, 1),
+                  "max ms": round(m["max"] * 1000, 1)} for name, m in stages.items()],
+                hide_index=True, use_container_width=True,
+            )
+        else:
+            st.caption("Încă nu există măsurători în acest proces.")
+        st.caption("Cache-uri")
+        st.json({"rezultate RAG": result_cache_stats(), "LLM": llm_cache_stats(),
+                 "semantic": semantic_cache_stats(), "STT": stt_cache_stats(),
+                 "TTS": tts_cache_stats()}, expanded=False)
+        tokens = usage_totals()
+        if tokens:
+            st.caption("Tokeni OpenAI (proces)")
+            st.dataframe([{"etapă": stage, **t} for stage, t in sorted(tokens.items())],
+                         hide_index=True, use_container_width=True)
 
 # ---------------------- Tabs ----------------------
 tab_text, tab_upload, tab_live_openai = st.tabs([
@@ -128,10 +204,15 @@ with tab_text:
             if not prompt.strip():
                 st.warning("Te rog scrie o întrebare.")
             else:
+                out = {}
                 with st.spinner("Găsesc potriviri și pregătesc rezumatul…"):
-                    out = recommend_with_tool(prompt.strip(), k=k, temperature=temperature, tts=tts, gen_image=gen_img)
+                    chunks = recommend_stream(prompt.strip(), k=k, temperature=temperature, tts=tts,
+                                              gen_image=gen_img, mode=reco_mode, result=out,
+                                              user_id=user_id)
+                    first = next(chunks, "")  # spinner only until the first visible byte
+                st.write_stream(_prepend(first, chunks))
                 st.success("Gata!")
-                st.markdown(out["text"])
+                if out.get("picked_title"): st.session_state["last_pick"] = out["picked_title"]
                 if out.get("audio"): st.audio(out["audio"])
                 if out.get("image"): st.image(out["image"], caption="Copertă simbolică generată")
     with c2:
@@ -151,12 +232,9 @@ with tab_upload:
         if audio_file is None:
             st.warning("Încarcă un fișier audio.")
         else:
-            tmp = Path("assets/tmp"); tmp.mkdir(parents=True, exist_ok=True)
-            p = tmp / audio_file.name
-            p.write_bytes(audio_file.read())
             with st.spinner("Transcriu…"):
                 try:
-                    transcript = transcribe_audio(p)
+                    transcript = _transcribe_progress(audio_file.getvalue())
                     st.success("Transcriere finalizată.")
                     st.caption(f"**Text:** {transcript}")
                 except Exception as e:
@@ -183,21 +261,23 @@ with tab_upload:
         if audio_file is None:
             st.warning("Încarcă un fișier audio.")
         else:
-            tmp = Path("assets/tmp"); tmp.mkdir(parents=True, exist_ok=True)
-            p = tmp / audio_file.name
-            p.write_bytes(audio_file.read())
             with st.spinner("Transcriu…"):
                 try:
-                    transcript = transcribe_audio(p)
+                    transcript = _transcribe_progress(audio_file.getvalue())
                     st.success("Transcriere finalizată.")
                     st.caption(f"**Text:** {transcript}")
                 except Exception as e:
                     st.error(f"Eroare STT: {e}")
                     transcript = ""
             if transcript:
+                out = {}
                 with st.spinner("Generez recomandarea…"):
-                    out = recommend_with_tool(transcript, k=k, temperature=temperature, tts=tts, gen_image=gen_img)
-                st.markdown(out["text"])
+                    chunks = recommend_stream(transcript, k=k, temperature=temperature, tts=tts,
+                                              gen_image=gen_img, mode=reco_mode, result=out,
+                                              user_id=user_id)
+                    first = next(chunks, "")
+                st.write_stream(_prepend(first, chunks))
+                if out.get("picked_title"): st.session_state["last_pick"] = out["picked_title"]
                 if out.get("audio"): st.audio(out["audio"])
                 if out.get("image"): st.image(out["image"], caption="Copertă simbolică generată")
     st.markdown('</div>', unsafe_allow_html=True)
@@ -260,8 +340,9 @@ with tab_live_openai:
             out = recommend_with_tool(transcript_box,
                                       k=int(os.getenv("RAG_TOP_K", "5")),
                                       temperature=float(os.getenv("CHAT_TEMPERATURE", "0.3")),
-                                      tts=False, gen_image=False)
+                                      tts=False, gen_image=False, mode=reco_mode, user_id=user_id)
             st.markdown(out["text"])
+            if out.get("picked_title"): st.session_state["last_pick"] = out["picked_title"]
 
     # --- Embedded HTML/JS widget (styled) ---
     components.html(f"""
@@ -0,0 +1,180 @@
+# app/vector_index.py
+"""
+In-process NumPy vector index — an alternative retrieval backend to Chroma (RAG_BACKEND=numpy).
+
+Layout in NUMPY_INDEX_DIR (written by init_vector_store after a build):
+  - vectors.npy    float32 [n, dim], rows L2-normalized  (memory-mapped read-only)
+  - meta.jsonl     one {"id", "metadata", "document"} per row, same order
+  - manifest.json  {"count", "dim", "model", "built_at"} — written last; its mtime is the version
+
+Queries return the same shape as chroma's collection.query(), with squared-L2 distances
+(= 2 - 2·cos on unit vectors), so rag.search_books scores results identically.
+A chroma-style `where` filter is evaluated once into a candidate row set (cached per filter),
+and only those rows are scored.
+Because the matrix is mmapped, several worker processes share one copy via the page cache.
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+VECTORS_FILE = "vectors.npy"
+META_FILE = "meta.jsonl"
+MANIFEST_FILE = "manifest.json"
+
+# -------------------- Export (ingest side) ---------------
+
+def export_from_collection(collection, out_dir: str | Path, model: str = "", page: int = 1000) -> int:
+    """Dump a Chroma collection into `out_dir` (see module docstring). Returns the row count."""
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    n = collection.count()
+    if n == 0:
+        return 0
+
+    vec_tmp = out / (VECTORS_FILE + ".tmp")
+    meta_tmp = out / (META_FILE + ".tmp")
+    mat = None
+    row = dim = 0
+    with meta_tmp.open("w", encoding="utf-8") as mf:
+        for offset in range(0, n, page):
+            res = collection.get(include=["embeddings", "metadatas", "documents"], limit=page, offset=offset)
+            ids = res.get("ids") or []
+            if not ids:
+                break
+            block = np.asarray(res["embeddings"], dtype=np.float32)
+            if mat is None:
+                dim = int(block.shape[1])
+                mat = np.lib.format.open_memmap(str(vec_tmp), mode="w+", dtype=np.float32,
+                                                shape=(n, block.shape[1]))
+            norms = np.linalg.norm(block, axis=1, keepdims=True)
+            mat[row:row + len(ids)] = block / np.maximum(norms, 1e-12)
+            for rid, meta, doc in zip(ids, res.get("metadatas") or [], res.get("documents") or []):
+                mf.write(json.dumps({"id": rid, "metadata": meta or {}, "document": doc or ""},
+                                    ensure_ascii=False) + "\n")
+            row += len(ids)
+    if mat is None:
+        return 0
+    mat.flush()
+    del mat
+    os.replace(vec_tmp, out / VECTORS_FILE)
+    os.replace(meta_tmp, out / META_FILE)
+    (out / MANIFEST_FILE).write_text(
+        json.dumps({"count": row, "dim": dim, "model": model, "built_at": time.time()}), encoding="utf-8"
+    )
+    return row
+
+# -------------------- Filters ----------------------------
+
+_OPS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+def match_where(meta: Dict[str, Any], where: Dict[str, Any]) -> bool:
+    """Evaluate the subset of chroma's `where` syntax we generate ($and/$or + field operators)."""
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(match_where(meta, c) for c in cond):
+                return False
+        elif key == "$or":
+            if not any(match_where(meta, c) for c in cond):
+                return False
+        elif isinstance(cond, dict):
+            val = meta.get(key)
+            try:
+                if not all(_OPS[op](val, arg) for op, arg in cond.items()):
+                    return False
+            except TypeError:
+                return False
+        elif meta.get(key) != cond:
+            return False
+    return True
+
+# -------------------- Query side -------------------------
+
+class NumpyIndex:
+    """Memory-mapped float32 matrix + row metadata; reloads itself when the manifest changes."""
+
+    def __init__(self, index_dir: str | Path):
+        self.dir = Path(index_dir)
+        self._lock = threading.Lock()
+        self._stamp: Optional[int] = None
+        self._mat: Optional[np.ndarray] = None
+        self._rows: List[Dict[str, Any]] = []
+        self._candidates: Dict[str, np.ndarray] = {}  # where (as JSON) -> matching row indices
+
+    def _ensure_loaded(self) -> None:
+        manifest = self.dir / MANIFEST_FILE
+        try:
+            stamp = manifest.stat().st_mtime_ns
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                f"NumPy index not found in {self.dir}; rebuild with RAG_BACKEND=numpy python -m app.init_vector_store"
+            )
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            mat = np.load(str(self.dir / VECTORS_FILE), mmap_mode="r")
+            with (self.dir / META_FILE).open(encoding="utf-8") as f:
+                rows = [json.loads(line) for line in f if line.strip()]
+            mat = mat[:len(rows)]  # if the collection shrank during export, trailing rows are unused
+            self._mat, self._rows, self._stamp = mat, rows, stamp
+            self._candidates = {}
+
+    def count(self) -> int:
+        self._ensure_loaded()
+        return len(self._rows)
+
+    def _candidate_rows(self, where: Dict[str, Any]) -> np.ndarray:
+        key = json.dumps(where, sort_keys=True)
+        rows = self._candidates.get(key)
+        if rows is None:
+            rows = np.fromiter((i for i, r in enumerate(self._rows) if match_where(r["metadata"], where)),
+                               dtype=np.int64)
+            if len(self._candidates) >= 256:
+                self._candidates.pop(next(iter(self._candidates)))
+            self._candidates[key] = rows
+        return rows
+
+    def query(self, query_embeddings: List[List[float]], n_results: int,
+              where: Optional[Dict[str, Any]] = None) -> Dict[str, List[List[Any]]]:
+        """Exact top-k by cosine; chroma-shaped result (ids/metadatas/documents/distances)."""
+        self._ensure_loaded()
+        mat, rows = self._mat, self._rows
+        res: Dict[str, List[List[Any]]] = {"ids": [], "metadatas": [], "documents": [], "distances": []}
+        cand = self._candidate_rows(where) if where and mat is not None else None
+        if mat is None or not len(rows) or (cand is not None and not len(cand)):
+            for key in res:
+                res[key] = [[] for _ in query_embeddings]
+            return res
+
+        q = np.asarray(query_embeddings, dtype=np.float32)
+        q /= np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        sub = mat if cand is None else mat[cand]
+        sims = q @ sub.T  # [nq, n_candidates]
+        k = max(1, min(int(n_results), sims.shape[1]))
+        for srow in sims:
+            top = np.argpartition(-srow, k - 1)[:k] if k < len(srow) else np.arange(len(srow))
+            top = top[np.argsort(-srow[top], kind="stable")]
+            ridx = top if cand is None else cand[top]
+            res["ids"].append([rows[i]["id"] for i in ridx])
+            res["metadatas"].append([rows[i]["metadata"] for i in ridx])
+            res["documents"].append([rows[i]["document"] for i in ridx])
+            res["distances"].append([float(2.0 - 2.0 * srow[j]) for j in top])
+        return res
@@ -0,0 +1,181 @@
+# bench/fake_openai.py
+"""
+Local stand-in for the OpenAI endpoints the app uses, for offline benchmarks.
+
+Endpoints (OpenAI wire format, deterministic outputs):
+  POST /v1/embeddings          -> unit vectors seeded by sha256(text), FAKE_EMBED_DIM dims
+  POST /v1/chat/completions    -> forced tool call (title = first CONTEXT CANDIDATE), json_schema
+                                  answer for structured output, plain bullets otherwise; SSE when stream=true
+  POST /v1/images/generations  -> a 1x1 PNG (b64_json)
+  POST /v1/realtime/sessions   -> {"client_secret": {"value": "ek_fake_..."}}
+
+Injected latency per endpoint family, in ms (uniform jitter of ±FAKE_JITTER around it):
+  FAKE_LATENCY_MS="embeddings=20,chat=300,images=500,realtime=80"
+
+Run:  python -m bench.fake_openai --port 8765
+Then: OPENAI_BASE_URL=http://127.0.0.1:8765/v1 OPENAI_API_KEY=bench ...
+"""
+
+from __future__ import annotations
+
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Any, Dict, List
+
+import numpy as np
+from fastapi import FastAPI, Request
+from starlette.responses import StreamingResponse
+
+FAKE_EMBED_DIM = int(os.getenv("FAKE_EMBED_DIM", "256"))
+FAKE_JITTER = float(os.getenv("FAKE_JITTER", "0.2"))
+DEFAULT_LATENCY_MS = {"embeddings": 20.0, "chat": 300.0, "images": 500.0, "realtime": 80.0}
+
+# 1x1 transparent PNG
+_PNG_B64 = "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+
+def parse_latency(spec: str) -> Dict[str, float]:
+    """"chat=300,embeddings=20" -> {"chat": 300.0, ...} on top of the defaults."""
+    out = dict(DEFAULT_LATENCY_MS)
+    for part in (spec or "").split(","):
+        if "=" in part:
+            k, v = part.split("=", 1)
+            out[k.strip()] = float(v)
+    return out
+
+LATENCY_MS = parse_latency(os.getenv("FAKE_LATENCY_MS", ""))
+
+app = FastAPI(title="fake-openai")
+
+async def _delay(kind: str) -> None:
+    ms = LATENCY_MS.get(kind, 0.0)
+    if ms > 0:
+        await asyncio.sleep(ms * random.uniform(1 - FAKE_JITTER, 1 + FAKE_JITTER) / 1000)
+
+def _vector(text: str, dim: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return (v / np.linalg.norm(v)).tolist()
+
+def _tokens(obj: Any) -> int:
+    return max(1, len(json.dumps(obj, ensure_ascii=False)) // 4)
+
+def _context_titles(messages: List[Dict[str, Any]]) -> List[str]:
+    for m in messages:
+        content = m.get("content")
+        if isinstance(content, str) and content.startswith("CONTEXT CANDIDATE: "):
+            try:
+                return [c.get("title") for c in json.loads(content[len("CONTEXT CANDIDATE: "):]) if c.get("title")]
+            except (ValueError, AttributeError):
+                return []
+    return []
+
+def _completion_id(body: Dict[str, Any]) -> str:
+    return "chatcmpl-" + hashlib.sha1(json.dumps(body, sort_keys=True, default=str).encode()).hexdigest()[:24]
+
+# -------------------- Endpoints --------------------------
+
+@app.post("/v1/embeddings")
+async def embeddings(req: Request):
+    body = await req.json()
+    inputs = body.get("input")
+    inputs = [inputs] if isinstance(inputs, str) else list(inputs or [])
+    dim = int(body.get("dimensions") or FAKE_EMBED_DIM)
+    await _delay("embeddings")
+    return {
+        "object": "list",
+        "model": body.get("model", "text-embedding-3-small"),
+        "data": [{"object": "embedding", "index": i, "embedding": _vector(t, dim)} for i, t in enumerate(inputs)],
+        "usage": {"prompt_tokens": _tokens(inputs), "total_tokens": _tokens(inputs)},
+    }
+
+@app.post("/v1/chat/completions")
+async def chat_completions(req: Request):
+    body = await req.json()
+    messages = body.get("messages") or []
+    titles = _context_titles(messages)
+    title = titles[0] if titles else "Unknown"
+    message: Dict[str, Any] = {"role": "assistant", "content": None}
+    tool_choice = body.get("tool_choice")
+    if body.get("tools") and isinstance(tool_choice, dict):
+        message["tool_calls"] = [{
+            "id": "call_" + hashlib.sha1(title.encode("utf-8")).hexdigest()[:12],
+            "type": "function",
+            "function": {"name": tool_choice["function"]["name"], "arguments": json.dumps({"title": title})},
+        }]
+        finish = "tool_calls"
+    elif (body.get("response_format") or {}).get("type") == "json_schema":
+        message["content"] = json.dumps({"title": title, "reasons": ["Se potrivește temelor cerute.",
+                                                                      "Ton și stil apropiate de cerere."]})
+        finish = "stop"
+    else:
+        message["content"] = "- Se potrivește temelor cerute.\n- Ton și stil apropiate de cerere."
+        finish = "stop"
+
+    usage = {"prompt_tokens": _tokens(messages), "completion_tokens": _tokens(message),
+             "total_tokens": _tokens(messages) + _tokens(message)}
+    base = {"id": _completion_id(body), "created": int(time.time()), "model": body.get("model", "gpt-4o-mini")}
+    await _delay("chat")
+
+    if body.get("stream"):
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        async def _sse():
+            words = (message["content"] or "").split(" ")
+            for i, w in enumerate(words):
+                delta = {"content": w if i == 0 else " " + w}
+                if i == 0:
+                    delta["role"] = "assistant"
+                chunk = {**base, "object": "chat.completion.chunk",
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+            last = {**base, "object": "chat.completion.chunk",
+                    "choices": [{"index": 0, "delta": {}, "finish_reason": finish}]}
+            yield f"data: {json.dumps(last)}\n\n"
+            if include_usage:
+                yield f"data: {json.dumps({**base, 'object': 'chat.completion.chunk', 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(_sse(), media_type="text/event-stream")
+
+    return {**base, "object": "chat.completion",
+            "choices": [{"index": 0, "message": message, "finish_reason": finish}], "usage": usage}
+
+@app.post("/v1/images/generations")
+async def images_generations(req: Request):
+    body = await req.json()
+    await _delay("images")
+    return {"created": int(time.time()), "data": [{"b64_json": _PNG_B64} for _ in range(int(body.get("n") or 1))]}
+
+@app.post("/v1/realtime/sessions")
+async def realtime_sessions(req: Request):
+    body = await req.json()
+    await _delay("realtime")
+    return {
+        "id": "sess_fake",
+        "object": "realtime.session",
+        "model": body.get("model"),
+        "client_secret": {"value": "ek_fake_" + hashlib.sha1(str(time.time_ns()).encode()).hexdigest()[:16],
+                          "expires_at": int(time.time()) + 60},
+    }
+
+# -------------------- CLI -------------------------------
+
+def main() -> None:
+    global LATENCY_MS
+    ap = argparse.ArgumentParser(description="Local OpenAI stand-in for benchmarks.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", default=os.getenv("FAKE_LATENCY_MS", ""),
+                    help='per endpoint, ms: "embeddings=20,chat=300,images=500,realtime=80"')
+    args = ap.parse_args()
+    LATENCY_MS = parse_latency(args.latency)
+    import uvicorn
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
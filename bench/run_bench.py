@@ -0,0 +1,279 @@
+# bench/run_bench.py
+"""
+Offline load test: replay a JSONL query corpus against search_books / recommend_with_tool /
+arecommend_with_tool / token_server at a fixed concurrency, with OpenAI replaced by
+bench/fake_openai.py. Caches are off unless --warm, so every request pays the full pipeline.
+
+  python -m bench.run_bench --target recommend --concurrency 8 --requests 200
+  python -m bench.run_bench --target search --latency "embeddings=5" --out bench/.work/search.json
+  python -m bench.run_bench --target recommend --baseline bench/.work/base.json --tolerance 0.25
+
+Reports end-to-end p50/p95/p99 + QPS (client side) and p50/p95/p99 per pipeline stage
+(app.metrics spans). With --baseline, exits 1 if any p95 regressed by more than --tolerance.
+
+Everything runs in bench/.work (index, caches, logs). App modules call load_dotenv(override=True),
+so a repo .env that sets one of the bench variables would silently win: the run stops instead
+(move .env aside, or pass --allow-dotenv to accept its values).
+"""
+
+from __future__ import annotations
+
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+WORK = ROOT / "bench" / ".work"
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+TARGETS = ("search", "recommend", "recommend_async", "token_server")
+
+# -------------------- Helpers ----------------------------
+
+def _percentiles(vals: List[float]) -> Dict[str, float]:
+    from app.metrics import _percentile
+    s = sorted(vals)
+    return {"p50": _percentile(s, 0.5), "p95": _percentile(s, 0.95), "p99": _percentile(s, 0.99),
+            "max": s[-1] if s else 0.0}
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _serve(app: Any, port: int) -> None:
+    """Run an ASGI app with uvicorn in a daemon thread; return once it accepts connections."""
+    import uvicorn
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    deadline = time.time() + 10
+    while not server.started:
+        if time.time() > deadline:
+            raise RuntimeError(f"server on port {port} did not start")
+        time.sleep(0.02)
+
+def _bench_env(args: argparse.Namespace, base_url: str) -> Dict[str, str]:
+    return {
+        "OPENAI_BASE_URL": base_url,
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench"),
+        "RAG_BACKEND": "numpy",
+        "NUMPY_INDEX_DIR": str(WORK / "vector_index"),
+        "CHROMA_DIR": str(WORK / "chroma"),
+        "EMBED_CACHE_PATH": str(WORK / "embed_cache.sqlite"),
+        "EMBED_CACHE": "true" if args.warm else "false",
+        "RESULT_CACHE_SIZE": "1024" if args.warm else "0",
+        "LLM_CACHE": "true" if args.warm else "false",
+        "LLM_CACHE_PATH": str(WORK / "llm_cache.sqlite"),
+        "SEMANTIC_CACHE": "true" if args.warm else "false",
+        "PREFS_DB_PATH": str(WORK / "user_prefs.sqlite"),
+        "LOG_JSONL_PATH": str(WORK / "interactions.jsonl"),
+        "METRICS_DIR": "",
+        "ASSETS_DIR": str(WORK / "assets"),
+    }
+
+def _apply_env(env: Dict[str, str], allow_dotenv: bool) -> None:
+    from dotenv import dotenv_values
+    dotenv = ROOT / ".env"
+    values = dotenv_values(dotenv) if dotenv.exists() else {}
+    clash = sorted(k for k, v in env.items() if k in values and values[k] != v)
+    if clash and not allow_dotenv:
+        sys.exit(f"[bench] {dotenv} overrides bench settings ({', '.join(clash)}); "
+                 "move it aside or pass --allow-dotenv.")
+    os.environ.update(env)
+
+def _build_index(batch: int = 64) -> int:
+    """Embed the catalog through the (fake) API and write the NumPy index used by RAG_BACKEND=numpy."""
+    from app.init_vector_store import DATA_JSON, EMBED_MODEL, iter_records
+    from app.vector_index import export_from_collection
+    from app.index_version import bump_index_version
+    from app.rag import embed_many
+
+    records = list(iter_records(DATA_JSON))
+    vectors: List[List[float]] = []
+    for start in range(0, len(records), batch):
+        vectors += embed_many([r[2] for r in records[start:start + batch]])
+
+    class _Rows:  # the slice of the chroma collection API export_from_collection uses
+        def count(self) -> int:
+            return len(records)
+
+        def get(self, include=None, limit: int = 1000, offset: int = 0) -> Dict[str, Any]:
+            part = records[offset:offset + limit]
+            return {"ids": [r[0] for r in part], "metadatas": [r[1] for r in part],
+                    "documents": [r[3] for r in part], "embeddings": vectors[offset:offset + limit]}
+
+    rows = export_from_collection(_Rows(), os.environ["NUMPY_INDEX_DIR"], model=EMBED_MODEL)
+    bump_index_version()
+    return rows
+
+def _load_corpus(path: Path) -> List[Dict[str, Any]]:
+    with path.open(encoding="utf-8") as f:
+        items = [json.loads(line) for line in f if line.strip()]
+    if not items:
+        sys.exit(f"[bench] empty corpus: {path}")
+    return items
+
+# -------------------- Workloads --------------------------
+
+def _make_call(args: argparse.Namespace) -> Callable[[Dict[str, Any]], Any]:
+    if args.target == "search":
+        from app.rag import search_books
+        return lambda item: search_books(item["query"], k=args.k, filters=item.get("filters"))
+    if args.target == "recommend":
+        from app.chatbot import recommend_with_tool
+        return lambda item: recommend_with_tool(item["query"], k=args.k, tts=args.tts, gen_image=args.image,
+                                                filters=item.get("filters"), mode=args.mode,
+                                                fast_path=not args.no_fast_path)
+    if args.target == "recommend_async":
+        from app.chatbot import arecommend_with_tool
+        return lambda item: asyncio.run(arecommend_with_tool(item["query"], k=args.k, tts=args.tts,
+                                                             gen_image=args.image, filters=item.get("filters"),
+                                                             mode=args.mode, fast_path=not args.no_fast_path))
+    if args.target == "token_server":
+        import httpx
+        import token_server
+        port = _free_port()
+        _serve(token_server.app, port)
+        client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=30)
+
+        def _session(item: Dict[str, Any]) -> Any:
+            r = client.get("/session")
+            r.raise_for_status()
+            return r.json()
+        return _session
+    raise ValueError(args.target)
+
+def _run(call: Callable[[Dict[str, Any]], Any], corpus: List[Dict[str, Any]], n: int,
+         concurrency: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def _one(i: int) -> None:
+        t0 = time.perf_counter()
+        try:
+            call(corpus[i % len(corpus)])
+            dt = time.perf_counter() - t0
+            with lock:
+                latencies.append(dt)
+        except Exception as e:  # keep going; report at the end
+            with lock:
+                errors.append(f"{type(e).__name__}: {e}")
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(concurrency, thread_name_prefix="bench") as pool:
+        list(pool.map(_one, range(n)))
+    wall = time.perf_counter() - t0
+    return {"requests": n, "ok": len(latencies), "errors": len(errors), "error_samples": errors[:3],
+            "wall_s": wall, "qps": len(latencies) / wall if wall else 0.0, "latency": _percentiles(latencies)}
+
+# -------------------- Report -----------------------------
+
+def _print_report(res: Dict[str, Any]) -> None:
+    lat = res["latency"]
+    print(f"\n[bench] target={res['target']} concurrency={res['concurrency']} "
+          f"requests={res['requests']} ok={res['ok']} errors={res['errors']}")
+    print(f"[bench] QPS={res['qps']:.1f}  end-to-end ms: p50={lat['p50'] * 1000:.1f} "
+          f"p95={lat['p95'] * 1000:.1f} p99={lat['p99'] * 1000:.1f} max={lat['max'] * 1000:.1f}")
+    for e in res["error_samples"]:
+        print(f"[bench]   error: {e}")
+    if res["stages"]:
+        print(f"\n{'stage':<34}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for name, m in res["stages"].items():
+            print(f"{name:<34}{m['count']:>7}{m['p50'] * 1000:>10.1f}{m['p95'] * 1000:>10.1f}{m['p99'] * 1000:>10.1f}")
+
+def _regressions(res: Dict[str, Any], baseline: Dict[str, Any], tolerance: float,
+                 min_delta: float = 0.005) -> List[str]:
+    """p95s (end-to-end + per stage) and QPS worse than the baseline by more than `tolerance`;
+    p95 changes under `min_delta` seconds are noise for sub-millisecond stages and are ignored."""
+    if baseline.get("target") != res["target"]:
+        return [f"baseline target is {baseline.get('target')!r}, not {res['target']!r}"]
+    out: List[str] = []
+    pairs = [("end-to-end", res["latency"], baseline.get("latency") or {})]
+    pairs += [(n, m, (baseline.get("stages") or {}).get(n) or {}) for n, m in res["stages"].items()]
+    for name, cur, old in pairs:
+        if "p95" in old and cur["p95"] > old["p95"] * (1 + tolerance) and cur["p95"] - old["p95"] > min_delta:
+            out.append(f"{name}: p95 {old['p95'] * 1000:.1f} -> {cur['p95'] * 1000:.1f} ms")
+    if baseline.get("qps") and res["qps"] < baseline["qps"] * (1 - tolerance):
+        out.append(f"QPS {baseline['qps']:.1f} -> {res['qps']:.1f}")
+    return out
+
+# -------------------- CLI -------------------------------
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Offline benchmark for the Smart Librarian pipeline.")
+    ap.add_argument("--target", choices=TARGETS, default="recommend")
+    ap.add_argument("--corpus", type=Path, default=ROOT / "bench" / "queries.jsonl")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--warmup", type=int, default=10, help="requests run before measuring")
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--mode", choices=("two_step", "single"), default=None)
+    ap.add_argument("--tts", action="store_true")
+    ap.add_argument("--image", action="store_true")
+    ap.add_argument("--no-fast-path", action="store_true")
+    ap.add_argument("--warm", action="store_true", help="enable the embedding/result/LLM/semantic caches")
+    ap.add_argument("--base-url", default=None, help="use a running OpenAI stand-in instead of spawning one")
+    ap.add_argument("--latency", default=os.getenv("FAKE_LATENCY_MS", ""),
+                    help='fake server latency, ms: "embeddings=20,chat=300,images=500,realtime=80"')
+    ap.add_argument("--rebuild-index", action="store_true")
+    ap.add_argument("--allow-dotenv", action="store_true")
+    ap.add_argument("--out", type=Path, default=None, help="write the results as JSON")
+    ap.add_argument("--baseline", type=Path, default=None, help="results JSON of a previous run")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 / QPS regression (fraction)")
+    ap.add_argument("--min-delta-ms", type=float, default=5.0, help="ignore p95 changes smaller than this")
+    args = ap.parse_args(argv)
+
+    os.chdir(ROOT)  # app defaults (DATA_JSON, ...) are relative to the project root
+    WORK.mkdir(parents=True, exist_ok=True)
+    base_url = args.base_url
+    if base_url is None:
+        from bench import fake_openai
+        fake_openai.LATENCY_MS = fake_openai.parse_latency(args.latency)
+        port = _free_port()
+        _serve(fake_openai.app, port)
+        base_url = f"http://127.0.0.1:{port}/v1"
+        print(f"[bench] fake OpenAI on {base_url} latency={fake_openai.LATENCY_MS}")
+    _apply_env(_bench_env(args, base_url), args.allow_dotenv)
+
+    if args.target != "token_server" and (args.rebuild_index or not (WORK / "vector_index" / "manifest.json").exists()):
+        t0 = time.perf_counter()
+        rows = _build_index()
+        print(f"[bench] NumPy index: {rows} rows in {time.perf_counter() - t0:.2f}s")
+
+    from app import metrics
+    corpus = _load_corpus(args.corpus)
+    call = _make_call(args)
+    if args.warmup:
+        _run(call, corpus, args.warmup, args.concurrency)
+    metrics.REGISTRY.reset()
+
+    res = _run(call, corpus, args.requests, args.concurrency)
+    res.update({"target": args.target, "concurrency": args.concurrency, "warm": args.warm,
+                "latency_ms_config": args.latency, "stages": metrics.snapshot()})
+    _print_report(res)
+
+    if args.out:
+        args.out.parent.mkdir(parents=True, exist_ok=True)
+        args.out.write_text(json.dumps(res, indent=2), encoding="utf-8")
+        print(f"\n[bench] results -> {args.out}")
+    if args.baseline:
+        bad = _regressions(res, json.loads(args.baseline.read_text(encoding="utf-8")), args.tolerance,
+                           args.min_delta_ms / 1000)
+        for line in bad:
+            print(f"[bench] REGRESSION {line}")
+        if bad:
+            return 1
+    return 1 if res["errors"] and not res["ok"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
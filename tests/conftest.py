@@ -0,0 +1,4 @@
+import os
+
+# Keep test runs from writing per-process snapshots into the app's data/metrics.
+os.environ["METRICS_DIR"] = ""
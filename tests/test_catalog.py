@@ -0,0 +1,21 @@
+import io
+import json
+
+import pytest
+
+from app.catalog import _iter_json_array
+
+MIXED = [1, 4.5e3, -0.25, 12345678901234567890, 1e-7, True, False, None, "x,]", {"a": [1, 2.5]}, [], 0]
+
+@pytest.mark.parametrize("spacing", [", ", ",", " ,\n  "])
+def test_scalars_split_across_chunks(spacing):
+    raw = ("[" + spacing.join(json.dumps(v) for v in MIXED) + "]").encode("utf-8")
+    for chunk_size in range(1, len(raw) + 2):
+        entries = list(_iter_json_array(io.BytesIO(raw), chunk_size=chunk_size))
+        assert [item for _, _, item in entries] == MIXED, chunk_size
+        for offset, length, item in entries:
+            assert json.loads(raw[offset:offset + length]) == item
+
+def test_truncated_number_at_eof_is_an_error():
+    with pytest.raises(ValueError):
+        list(_iter_json_array(io.BytesIO(b"[1, 4."), chunk_size=2))
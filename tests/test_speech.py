@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from app.speech import SAMPLE_RATE, _resample
+
+def _tones(t):
+    return 0.5 * np.sin(2 * np.pi * 440 * t) + 0.2 * np.sin(2 * np.pi * 1234 * t)
+
+@pytest.mark.parametrize("sr", [8000, 11025, 22050, 44100, 48000])
+@pytest.mark.parametrize("seconds", [0.73, 3.37, 12.37])
+def test_resample_matches_reference_up_to_the_last_sample(sr, seconds):
+    x = _tones(np.arange(int(sr * seconds)) / sr).astype(np.float32)
+    y = _resample(x, sr)
+    assert y.dtype == np.float32
+    assert len(y) == round(len(x) * SAMPLE_RATE / sr)
+    t = np.arange(len(y)) / SAMPLE_RATE
+    err = np.abs(y - _tones(t))[t <= (len(x) - 1) / sr]  # past the last input sample is extrapolation
+    assert err[:-200].max() < 1e-4
+    assert err[-200:].max() < 5e-3  # no click at the end (was ~0.1-0.2 without end padding)
+
+def test_resample_passthrough_and_empty():
+    x = np.ones(10, np.float32)
+    assert _resample(x, SAMPLE_RATE) is x
+    assert len(_resample(np.zeros(0, np.float32), 44100)) == 0
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from app import tools
+
+BOOKS = [
+    {"title": "Sapiens", "author": "Yuval Noah Harari", "summary": "Istoria speciei umane."},
+    {"title": "Harry Potter and the Sorcerer's Stone", "author": "J.K. Rowling", "summary": "Un băiat vrăjitor."},
+    {"title": "A Brief History of Time", "author": "Stephen Hawking", "summary": "Cosmologie pe înțelesul tuturor."},
+    {"title": "The Hobbit", "author": "J.R.R. Tolkien", "summary": "Bilbo pleacă la drum."},
+]
+
+@pytest.fixture
+def catalog(tmp_path, monkeypatch):
+    path = tmp_path / "books.json"
+    path.write_text(json.dumps(BOOKS), encoding="utf-8")
+    monkeypatch.setattr(tools, "DATA_JSON", str(path))
+    monkeypatch.setattr(tools, "TITLE_INDEX_PATH", "")
+    monkeypatch.setattr(tools, "_index", None)
+    return path
+
+def test_title_with_added_subtitle(catalog):
+    assert tools.get_summary_by_title("Sapiens: A Brief History of Humankind") == "Istoria speciei umane."
+
+def test_partial_title(catalog):
+    assert tools.get_summary_by_title("Harry Potter") == "Un băiat vrăjitor."
+
+def test_typo_still_matches(catalog):
+    assert tools.get_summary_by_title("The Hobit") == "Bilbo pleacă la drum."
+
+def test_unrelated_title_is_not_found(catalog):
+    assert tools.get_summary_by_title("Război și pace").startswith("Nu am găsit rezumat")
@@ -5,14 +5,18 @@ from typing import Optional
 import httpx
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.responses import JSONResponse
+from starlette.responses import JSONResponse, PlainTextResponse
 from dotenv import load_dotenv
 
+from app.metrics import prometheus_text, span
+
 load_dotenv(override=True)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 REALTIME_MODEL = os.getenv("REALTIME_MODEL", "gpt-4o-mini-realtime-preview")
 TRANSCRIBE_MODEL = os.getenv("REALTIME_TRANSCRIBE_MODEL", "gpt-4o-mini-transcribe")
+# Same variable the OpenAI SDK reads; point it at bench/fake_openai.py for offline load tests
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip("/")
 
 if not OPENAI_API_KEY:
     raise RuntimeError("OPENAI_API_KEY missing in environment.")
@@ -35,6 +39,11 @@ _last_text: str = ""
 async def healthz():
     return {"ok": True}
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text format: per-stage latency histograms + p50/p95/p99 (this process + app snapshots)."""
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
+
 @app.get("/session")
 async def create_session():
     """
@@ -45,22 +54,23 @@ async def create_session():
         "model": REALTIME_MODEL,
         "input_audio_transcription": {"model": TRANSCRIBE_MODEL},
     }
-    log.info("POST /v1/realtime/sessions starting")
+    log.info("POST %s/realtime/sessions starting", OPENAI_BASE_URL)
 
     # trust_env=True makes httpx honor HTTPS_PROXY/HTTP_PROXY from your env
     timeout = httpx.Timeout(connect=10.0, read=20.0, write=20.0, pool=10.0)
 
     try:
         async with httpx.AsyncClient(timeout=timeout, follow_redirects=True, trust_env=True) as client:
-            r = await client.post(
-                "https://api.openai.com/v1/realtime/sessions",
-                headers={
-                    "Authorization": f"Bearer {OPENAI_API_KEY}",
-                    "Content-Type": "application/json",
-                    "OpenAI-Beta": "realtime=v1",
-                },
-                json=payload,
-            )
+            with span("token_server.realtime_session"):
+                r = await client.post(
+                    f"{OPENAI_BASE_URL}/realtime/sessions",
+                    headers={
+                        "Authorization": f"Bearer {OPENAI_API_KEY}",
+                        "Content-Type": "application/json",
+                        "OpenAI-Beta": "realtime=v1",
+                    },
+                    json=payload,
+                )
             log.info("OpenAI response status: %s", r.status_code)
             r.raise_for_status()
             data = r.json()